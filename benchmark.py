@@ -0,0 +1,328 @@
+"""Offline benchmarks for the Lab 4-6 code paths.
+
+Starts fake_openai.py in a subprocess, points the OpenAI SDK and the weather
+lookup at it, and drives the lab functions directly from a scratch working
+directory (fresh ChromaDB, caches and telemetry on every run):
+
+    python benchmark.py --latency-ms 300 --token-ms 10 --output benchmarks.jsonl
+
+Each run prints a summary and can append it, tagged with the current git
+commit, to a JSONL file so results can be compared between commits.
+
+No network access is needed, except that tiktoken downloads its BPE files
+the first time an encoding is used. Load cl100k_base and o200k_base once
+while online (or point TIKTOKEN_CACHE_DIR at a copy) before running offline;
+the benchmark checks for them up front.
+"""
+import argparse
+import importlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Tokenizers used by chunking and context packing
+ENCODINGS = ("cl100k_base", "o200k_base")
+
+QUERIES = [
+    "What are the prerequisites for IST 736?",
+    "How is the final project graded?",
+    "Which course covers deep learning?",
+    "What is the late submission policy?",
+    "When are office hours held?",
+    "What textbooks are required for IST 652?",
+    "How many exams are there in IST 614?",
+    "Which course teaches building AI applications?",
+    "What programming language is used in the text mining course?",
+    "How much is class participation worth?",
+    "What topics are covered in week one?",
+    "Is attendance mandatory?",
+    "What is the academic integrity policy?",
+    "Which courses include group projects?",
+    "How are homework assignments submitted?",
+    "What does IST 782 focus on?",
+    "Who teaches the deep learning course?",
+    "What software do I need to install?",
+    "Are there any quizzes?",
+    "What are the learning objectives of IST 688?",
+]
+
+LOCATIONS = ["Syracuse, NY", "London, England", "Tokyo", "Paris", "Sydney", "Toronto"]
+
+CLAIMS = [
+    "The Great Wall of China is visible from space with the naked eye.",
+    "Water boils at 100 degrees Celsius at sea level.",
+    "Humans only use 10 percent of their brains.",
+    "Lightning never strikes the same place twice.",
+    "The Eiffel Tower was completed in 1889.",
+    "Bats are blind.",
+    "Mount Everest is the tallest mountain above sea level.",
+    "Goldfish have a three-second memory.",
+]
+
+
+def percentiles(values):
+    """p50/p95/mean in ms for a list of seconds"""
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "mean_ms": round(float(ms.mean()), 1),
+        "n": len(values),
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_server(args):
+    """Run fake_openai.py in its own process so it doesn't compete for our GIL"""
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(REPO_DIR, "fake_openai.py"),
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--token-ms", str(args.token_ms),
+        "--weather-ms", str(args.weather_ms),
+        "--completion-tokens", str(args.completion_tokens),
+        "--dims", str(args.dims),
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            urllib.request.urlopen(base_url + "/v1/models", timeout=1).read()
+            return server, base_url
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("Fake API server did not start")
+            time.sleep(0.1)
+
+
+def prepare_workdir(workdir, pdf_directory):
+    """Scratch directory with the PDFs and fake secrets; the labs use relative paths"""
+    shutil.copytree(pdf_directory, os.path.join(workdir, "pdfs"))
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write('OPENAI_API_KEY = "sk-offline-benchmark"\nOPENWEATHERMAP_API_KEY = "offline-benchmark"\n')
+
+
+def check_encodings():
+    """Fail fast if a tiktoken encoding can't be loaded (it is downloaded on first use)"""
+    token_utils = importlib.import_module("token_utils")
+    for name in ENCODINGS:
+        try:
+            token_utils.get_encoding(name)
+        except Exception as e:
+            raise RuntimeError(
+                f"tiktoken encoding {name} is not available ({e}). Run once with network access "
+                "or set TIKTOKEN_CACHE_DIR to a directory holding the cached BPE files."
+            ) from e
+
+
+def bench_ingestion(lab4):
+    progress = lab4.IngestProgress()
+    collection, elapsed = timed(lab4.create_lab4_vectordb, progress)
+    snapshot = progress.snapshot()
+    if collection is None or snapshot["errors"] or snapshot["files_failed"]:
+        raise RuntimeError(
+            f"Ingestion failed ({snapshot['files_failed']} of {snapshot['total_files']} files): {snapshot['errors']}"
+        )
+    files = snapshot["files_done"]
+    chunks = collection.count()
+    if not chunks:
+        raise RuntimeError("Ingestion stored no chunks")
+    # A second sync of an unchanged corpus should be nearly free
+    _, resync = timed(lab4.create_lab4_vectordb)
+    return collection, {
+        "files": files,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(files / elapsed, 2),
+        "chunks_per_sec": round(chunks / elapsed, 1),
+        "resync_seconds": round(resync, 3),
+    }
+
+
+def bench_retrieval(lab4, resources, collection, queries):
+    """Cold (in-memory caches cleared) and warm latency per retrieval mode.
+
+    Query vectors stay in the persistent embedding cache, so only the first
+    mode's cold pass pays for embedding calls.
+    """
+    results = {}
+    for mode in lab4.RETRIEVAL_MODES:
+        resources.get_retrieval_cache().clear()
+        resources.get_query_embedding_cache().clear()
+        cold = [timed(lab4.search_vectordb, collection, q, top_k=5, mode=mode)[1] for q in queries]
+        warm = [timed(lab4.search_vectordb, collection, q, top_k=5, mode=mode)[1] for q in queries]
+        results[mode] = {"cold": percentiles(cold), "warm": percentiles(warm)}
+    return results
+
+
+def bench_rag(lab4, resources, collection, queries):
+    """End-to-end time to first token: retrieval plus the streamed answer's first chunk"""
+    resources.get_retrieval_cache().clear()
+    resources.get_query_embedding_cache().clear()
+    first_tokens, totals = [], []
+    for query in queries:
+        # Reworded so the question is new to the embedding cache too
+        query = f"{query} Please answer briefly."
+        start = time.perf_counter()
+        candidates = lab4.search_vectordb(collection, query, top_k=lab4.RAG_CANDIDATES)
+        docs = lab4.load_passages(collection, lab4.select_passages(collection, query, candidates))
+        stream = lab4.generate_rag_response(query, docs)
+        next(stream)
+        first_tokens.append(time.perf_counter() - start)
+        for _ in stream:
+            pass
+        totals.append(time.perf_counter() - start)
+    return {"ttft": percentiles(first_tokens), "total": percentiles(totals)}
+
+
+def bench_clothing(lab5, resources, locations):
+    resources.get_weather_cache(lab5.weather_cache_ttl).clear()
+    single = [timed(lab5.get_clothing_suggestions, location)[1] for location in locations]
+    resources.get_weather_cache(lab5.weather_cache_ttl).clear()
+    _, compare = timed(lab5.get_clothing_suggestions, locations)
+    return {"single": percentiles(single), "compare_seconds": round(compare, 3), "compare_locations": len(locations)}
+
+
+def bench_fact_check(lab6, claims):
+    cold = [timed(lab6.fact_check_claim, claim)[1] for claim in claims]
+    # Same claims again: answered from the verdict cache
+    warm = [timed(lab6.fact_check_claim, claim)[1] for claim in claims]
+    return {"cold": percentiles(cold), "warm": percentiles(warm)}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    server, base_url = start_fake_server(args)
+    workdir = tempfile.mkdtemp(prefix="lab-benchmark-")
+    cwd = os.getcwd()
+    report = {"commit": git_commit(), "ts": time.time(), "settings": {
+        key: getattr(args, key)
+        for key in ("backend", "latency_ms", "token_ms", "weather_ms", "completion_tokens", "dims")
+    }}
+    try:
+        sys.path.insert(0, REPO_DIR)
+        check_encodings()
+        prepare_workdir(workdir, args.pdfs)
+        os.chdir(workdir)
+        os.environ["OPENAI_API_KEY"] = "sk-offline-benchmark"
+        os.environ["OPENAI_BASE_URL"] = base_url + "/v1"
+        os.environ["OPENWEATHERMAP_BASE_URL"] = base_url + "/data/2.5/"
+        os.environ["VECTOR_BACKEND"] = args.backend
+
+        resources = importlib.import_module("resources")
+        stages = set(args.stages)
+        if stages & {"ingest", "retrieval", "rag"}:
+            lab4 = importlib.import_module("lab4")
+            collection, report["ingestion"] = bench_ingestion(lab4)
+            queries = QUERIES[:args.queries]
+            if "retrieval" in stages:
+                report["retrieval"] = bench_retrieval(lab4, resources, collection, queries)
+            if "rag" in stages:
+                report["rag"] = bench_rag(lab4, resources, collection, queries[:args.rag_queries])
+        if "clothing" in stages:
+            report["clothing"] = bench_clothing(importlib.import_module("lab5"), resources, LOCATIONS)
+        if "fact_check" in stages:
+            report["fact_check"] = bench_fact_check(importlib.import_module("lab6"), CLAIMS)
+
+        telemetry = importlib.import_module("telemetry")
+        report["telemetry"] = telemetry.summarize_events(telemetry.load_events())
+    finally:
+        os.chdir(cwd)
+        server.terminate()
+        server.wait()
+        if args.keep_workdir:
+            print(f"Working directory kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    print(f"commit {report['commit']}  settings {report['settings']}")
+    if "ingestion" in report:
+        ingestion = report["ingestion"]
+        print(
+            f"ingestion: {ingestion['files']} files / {ingestion['chunks']} chunks in {ingestion['seconds']}s "
+            f"({ingestion['docs_per_sec']} docs/s, {ingestion['chunks_per_sec']} chunks/s); "
+            f"resync {ingestion['resync_seconds']}s"
+        )
+    for mode, result in report.get("retrieval", {}).items():
+        print(f"retrieval {mode:8} cold {result['cold']}  warm {result['warm']}")
+    if "rag" in report:
+        print(f"rag ttft {report['rag']['ttft']}  total {report['rag']['total']}")
+    if "clothing" in report:
+        clothing = report["clothing"]
+        print(
+            f"clothing single {clothing['single']}  "
+            f"compare {clothing['compare_locations']} locations {clothing['compare_seconds']}s"
+        )
+    if "fact_check" in report:
+        print(f"fact check cold {report['fact_check']['cold']}  warm {report['fact_check']['warm']}")
+    print("stages:")
+    for row in report["telemetry"]:
+        if row["p50_ms"] is not None:
+            print(f"  {row['stage']:32} n={row['count']:<5} p50={row['p50_ms']:<9} p95={row['p95_ms']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Lab 4-6 code paths")
+    parser.add_argument("--pdfs", default=os.path.join(REPO_DIR, "pdfs"), help="directory of PDFs to ingest")
+    parser.add_argument("--queries", type=int, default=len(QUERIES), help="retrieval queries per mode")
+    parser.add_argument("--rag-queries", type=int, default=5, help="queries answered end to end")
+    parser.add_argument(
+        "--stages", nargs="+", default=["ingest", "retrieval", "rag", "clothing", "fact_check"],
+        choices=["ingest", "retrieval", "rag", "clothing", "fact_check"]
+    )
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy", "numpy-int8"], help="Lab 4 vector store")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--weather-ms", type=float, default=150)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--output", help="append the report as one JSON line to this file")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
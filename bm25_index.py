@@ -0,0 +1,115 @@
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Course codes and similar identifiers ("IST 736", "IST736") also index as one token
+_CODE_RE = re.compile(r"\b([a-z]{2,5})\s?-?(\d{3,4})\b")
+
+
+def tokenize(text):
+    """Lowercased word tokens plus joined letter+number codes"""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+    tokens.extend(prefix + number for prefix, number in _CODE_RE.findall(text))
+    return tokens
+
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25.
+
+    Documents can be added and removed incrementally; the packed NumPy posting
+    arrays are rebuilt lazily on the first search after a change.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs = {}  # id -> (Counter of terms, length, filename)
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._ids = []
+        self._postings = {}  # term -> (doc positions, precomputed BM25 term weights)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, ids, texts, filenames):
+        """Index (or re-index) documents"""
+        with self._lock:
+            for doc_id, text, filename in zip(ids, texts, filenames):
+                tokens = tokenize(text)
+                self._docs[doc_id] = (Counter(tokens), len(tokens), filename)
+            self._dirty = True
+
+    def remove_file(self, filename):
+        """Drop every document that came from a file"""
+        with self._lock:
+            doomed = [doc_id for doc_id, (_, _, name) in self._docs.items() if name == filename]
+            for doc_id in doomed:
+                del self._docs[doc_id]
+            if doomed:
+                self._dirty = True
+
+    def _rebuild(self):
+        """Pack the postings into arrays; caller holds the lock"""
+        self._ids = list(self._docs)
+        n_docs = len(self._ids)
+        self._postings = {}
+        if n_docs == 0:
+            self._dirty = False
+            return
+
+        lengths = np.array([self._docs[doc_id][1] for doc_id in self._ids], dtype=np.float32)
+        avg_length = max(float(lengths.mean()), 1.0)
+        length_norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+
+        positions = {}
+        freqs = {}
+        for position, doc_id in enumerate(self._ids):
+            for term, tf in self._docs[doc_id][0].items():
+                positions.setdefault(term, []).append(position)
+                freqs.setdefault(term, []).append(tf)
+
+        for term, term_positions in positions.items():
+            term_positions = np.array(term_positions, dtype=np.int32)
+            tf = np.array(freqs[term], dtype=np.float32)
+            df = len(term_positions)
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # The whole BM25 term contribution only depends on the document, so precompute it
+            weights = idf * tf * (self.k1 + 1) / (tf + length_norm[term_positions])
+            self._postings[term] = (term_positions, weights.astype(np.float32))
+        self._dirty = False
+
+    def search(self, query, top_k=10):
+        """Return [(id, score), ...] for the best lexical matches"""
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            if not self._ids:
+                return []
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if posting is not None:
+                    # Positions are unique within a posting list, so fancy-index add is safe
+                    scores[posting[0]] += posting[1]
+
+            matched = np.flatnonzero(scores)
+            if matched.size == 0:
+                return []
+            top_k = min(top_k, matched.size)
+            best = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+            best = best[np.argsort(-scores[best])]
+            return [(self._ids[i], float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """Fuse ranked id lists; returns [(id, score), ...] best first"""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import telemetry
+
+CLAIM_CACHE_PATH = "./.cache/claim_verdicts.sqlite3"
+# Cosine similarity above which two claims are treated as the same question
+CLAIM_SIMILARITY_THRESHOLD = 0.92
+CLAIM_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+def normalize_claim(claim):
+    """Exact-match key: case, punctuation and spacing don't matter"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", claim.lower())).strip()
+
+
+class ClaimCache:
+    """Persistent fact-check verdicts keyed by (model, normalized claim).
+
+    Besides exact lookups, each model's claim embeddings are held in a
+    normalized float32 NumPy matrix so near-duplicate claims can be matched
+    with one matrix-vector product.
+    """
+
+    def __init__(self, path=CLAIM_CACHE_PATH, ttl=CLAIM_CACHE_TTL, clock=time.time):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.clock = clock
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS verdicts (
+                model TEXT NOT NULL,
+                claim_key TEXT NOT NULL,
+                claim TEXT NOT NULL,
+                result TEXT NOT NULL,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model, claim_key)
+            )"""
+        )
+        self._conn.commit()
+        self._entries = {}  # model -> {claim_key: (claim, result, embedding or None, created_at)}
+        self._matrices = {}  # model -> (keys, matrix, created_at array), rebuilt when stale
+        self._load()
+
+    def _load(self):
+        cutoff = self.clock() - self.ttl
+        self._conn.execute("DELETE FROM verdicts WHERE created_at < ?", (cutoff,))
+        self._conn.commit()
+        rows = self._conn.execute("SELECT model, claim_key, claim, result, embedding, created_at FROM verdicts")
+        for model, key, claim, result, blob, created_at in rows:
+            embedding = np.frombuffer(blob, dtype=np.float32) if blob else None
+            self._entries.setdefault(model, {})[key] = (claim, json.loads(result), embedding, created_at)
+
+    def _fresh(self, created_at):
+        return created_at >= self.clock() - self.ttl
+
+    def get_exact(self, model, claim):
+        """Cached result for this exact (normalized) claim, or None"""
+        with self._lock:
+            entry = self._entries.get(model, {}).get(normalize_claim(claim))
+            if entry and self._fresh(entry[3]):
+                self.exact_hits += 1
+                telemetry.record_cache("claims", hits=1)
+                return entry[1]
+            return None
+
+    def _matrix(self, model):
+        """(keys, unit-norm matrix, created_at) for a model; caller holds the lock"""
+        if model not in self._matrices:
+            items = [(key, entry) for key, entry in self._entries.get(model, {}).items() if entry[2] is not None]
+            if items:
+                matrix = np.vstack([entry[2] for _, entry in items]).astype(np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                created = np.array([entry[3] for _, entry in items])
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+                created = np.zeros(0)
+            self._matrices[model] = ([key for key, _ in items], matrix, created)
+        return self._matrices[model]
+
+    def find_similar(self, model, embedding, threshold=CLAIM_SIMILARITY_THRESHOLD):
+        """Closest fresh prior claim above the threshold.
+
+        Returns (result, matched_claim, similarity) or None. Counts a miss when
+        nothing matches, so call it after get_exact() has failed.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            keys, matrix, created = self._matrix(model)
+            if len(keys) and matrix.shape[1] == query.shape[0]:
+                similarities = matrix @ query
+                # Expired claims can't match
+                similarities[created < self.clock() - self.ttl] = -1.0
+                best = int(np.argmax(similarities))
+                if similarities[best] >= threshold:
+                    self.semantic_hits += 1
+                    telemetry.record_cache("claims", hits=1)
+                    claim, result, _, _ = self._entries[model][keys[best]]
+                    return result, claim, float(similarities[best])
+            self.misses += 1
+            telemetry.record_cache("claims", misses=1)
+            return None
+
+    def put(self, model, claim, result, embedding=None):
+        """Store a verdict (and the claim's embedding, for near-duplicate matching)"""
+        key = normalize_claim(claim)
+        vector = np.asarray(embedding, dtype=np.float32) if embedding is not None else None
+        created_at = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (model, claim_key, claim, result, embedding, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (model, key, claim, json.dumps(result), vector.tobytes() if vector is not None else None, created_at),
+            )
+            self._conn.commit()
+            self._entries.setdefault(model, {})[key] = (claim, result, vector, created_at)
+            self._matrices.pop(model, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+            }
@@ -0,0 +1,94 @@
+import numpy as np
+
+from token_utils import ENCODING_NAME, count_tokens, truncate_tokens
+
+# A passage cut down to less than this isn't worth its header
+MIN_PARTIAL_TOKENS = 64
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_mult=0.7):
+    """Indices of k candidates chosen by maximal marginal relevance.
+
+    Each pick maximizes lambda * sim(query, c) - (1 - lambda) * max sim(c, picked),
+    so near-duplicates of passages already chosen lose out to new evidence.
+    All similarities come from two matrix products up front.
+    """
+    candidates = _unit_rows(candidate_vectors)
+    if candidates.ndim != 2 or not len(candidates):
+        return []
+    relevance = candidates @ _unit_rows(query_vector)
+    similarity = candidates @ candidates.T
+
+    selected = []
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(min(k, len(candidates))):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def _passage(number, label, text):
+    return f"--- Passage {number}: {label} ---\n{text}"
+
+
+def pack_passages(passages, budget_tokens, encoding_name=ENCODING_NAME):
+    """Fit labelled passages into a token budget, measured with the model's tokenizer.
+
+    passages is [(label, text)] in priority order. Whole passages are taken
+    greedily, skipping any that no longer fit; if useful room is left, the
+    best skipped passage is cut down to fill it. Returns (context, indices of
+    the passages used, in the order they appear).
+    """
+    def tokens(text):
+        return count_tokens(text, encoding_name)
+
+    separator_tokens = tokens("\n\n")
+    chosen = {}  # passage index -> text to include
+    remaining = budget_tokens
+    skipped = None
+    for i, (label, text) in enumerate(passages):
+        cost = tokens(_passage(len(chosen) + 1, label, text)) + (separator_tokens if chosen else 0)
+        if cost <= remaining:
+            chosen[i] = text
+            remaining -= cost
+        elif skipped is None:
+            skipped = i
+
+    if skipped is not None:
+        label, text = passages[skipped]
+        overhead = tokens(_passage(len(chosen) + 1, label, "")) + (separator_tokens if chosen else 0)
+        if remaining - overhead >= MIN_PARTIAL_TOKENS:
+            chosen[skipped] = truncate_tokens(text, remaining - overhead, encoding_name)
+
+    used = sorted(chosen)
+
+    def render():
+        return "\n\n".join(
+            _passage(number, passages[i][0], chosen[i]) for number, i in enumerate(used, start=1)
+        )
+
+    # Tokens can merge differently across joins and renumbered headers; trim until exact.
+    # Every pass either shortens the last passage or drops it, so the loop ends
+    context = render()
+    overflow = tokens(context) - budget_tokens
+    while overflow > 0 and used:
+        last = used[-1]
+        current = tokens(chosen[last])
+        keep = current - overflow
+        trimmed = truncate_tokens(chosen[last], keep, encoding_name) if keep >= MIN_PARTIAL_TOKENS else None
+        if trimmed is None or tokens(trimmed) >= current:
+            used.pop()
+        else:
+            chosen[last] = trimmed
+        context = render()
+        overflow = tokens(context) - budget_tokens
+    return context, used
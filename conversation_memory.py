@@ -0,0 +1,117 @@
+from token_utils import count_tokens, truncate_tokens
+
+# Rough per-message overhead the chat format adds on top of the content tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an assistant.
+Keep facts, names, preferences, open questions and decisions; drop pleasantries.
+Reply with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages to fold in:
+{transcript}"""
+
+
+def message_tokens(message):
+    """Tokens a chat message costs in the prompt"""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summarize_conversation(client, model, summary, messages, max_words=150):
+    """Fold messages into the running summary with one completion call"""
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{
+            "role": "user",
+            "content": SUMMARY_PROMPT.format(
+                max_words=max_words,
+                summary=summary or "(none yet)",
+                transcript=transcript
+            )
+        }],
+        max_tokens=max_words * 2
+    )
+    return response.choices[0].message.content.strip()
+
+
+class ConversationMemory:
+    """Chat context that stays within a token budget.
+
+    Recent messages are kept verbatim as long as they fit in budget_tokens.
+    Older ones are folded into a rolling summary by a background job. Until
+    that job finishes, prompts use the previous summary plus the recent
+    messages, so no turn has to wait for summarization.
+    """
+
+    def __init__(self, budget_tokens=2000, max_message_tokens=1000, min_recent_messages=2):
+        self.budget_tokens = budget_tokens
+        self.max_message_tokens = max_message_tokens
+        self.min_recent_messages = min_recent_messages
+        self.summary = ""
+        self.recent = []
+        self._folding = []
+        self._future = None
+
+    def add(self, role, content):
+        """Record a message, clipping oversized ones to max_message_tokens"""
+        clipped = truncate_tokens(content, self.max_message_tokens)
+        if clipped != content:
+            clipped += "\n[…message truncated]"
+        self.recent.append({"role": role, "content": clipped})
+
+    def _collect_summary(self):
+        """Adopt a finished background summary, or give back its messages if it failed"""
+        if self._future is None or not self._future.done():
+            return
+        try:
+            self.summary = self._future.result()
+        except Exception:
+            # Try again with these messages on the next fold
+            self.recent = self._folding + self.recent
+        self._folding = []
+        self._future = None
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def messages(self, system_prompt=None):
+        """Prompt messages: system prompt, summary, then as many recent messages as fit"""
+        self._collect_summary()
+        prefix = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        if self.summary:
+            prefix.append(self._summary_message())
+
+        budget = self.budget_tokens - sum(message_tokens(message) for message in prefix)
+        kept = []
+        for message in reversed(self.recent):
+            cost = message_tokens(message)
+            # The newest message is always sent; max_message_tokens already bounds it
+            if kept and cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        return prefix + list(reversed(kept))
+
+    def tokens(self):
+        """Tokens the next prompt will use (without a system prompt)"""
+        return sum(message_tokens(message) for message in self.messages())
+
+    def maybe_summarize(self, executor, summarize):
+        """Start folding the oldest messages into the summary once over budget.
+
+        summarize(summary, messages) runs on the executor; the result is picked
+        up on a later turn.
+        """
+        self._collect_summary()
+        if self._future is not None:
+            return
+        # Leave room for the summary itself so the next prompt still fits
+        budget = self.budget_tokens - (message_tokens(self._summary_message()) if self.summary else 0)
+        while (len(self.recent) > self.min_recent_messages
+               and sum(message_tokens(message) for message in self.recent) > budget):
+            self._folding.append(self.recent.pop(0))
+        if self._folding:
+            self._future = executor.submit(summarize, self.summary, list(self._folding))
@@ -0,0 +1,73 @@
+import mmap
+import os
+import threading
+
+
+class CorpusStore:
+    """Append-only UTF-8 text file, read back through a memory map.
+
+    append() returns (byte offset, byte length) spans that callers keep in
+    their metadata; read() decodes just that slice of the mapped file, so a
+    query only ever touches the text of the passages it actually uses.
+    Text of replaced or deleted chunks stays in the file; reset() empties it
+    when the vector store it belongs to starts over empty.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        with open(path, "ab"):
+            pass
+        self._size = os.path.getsize(path)
+        self._map = None
+        self._mapped_size = 0
+
+    def append(self, texts):
+        """Write texts to the end of the file; returns their (offset, length) spans"""
+        spans = []
+        with self._lock:
+            with open(self.path, "ab") as f:
+                for text in texts:
+                    data = text.encode("utf-8")
+                    f.write(data)
+                    spans.append((self._size, len(data)))
+                    self._size += len(data)
+        return spans
+
+    def _mapped(self, end):
+        """A map covering at least the first end bytes; caller holds the lock"""
+        if end > self._mapped_size:
+            with open(self.path, "rb") as f:
+                # The previous map is left to the garbage collector; reads may still hold it
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped_size = len(self._map)
+            if end > self._mapped_size:
+                raise ValueError(f"Span ends at byte {end}, past the end of {self.path}")
+        return self._map
+
+    def read(self, offset, length):
+        """Text stored at a span"""
+        if length == 0:
+            return ""
+        with self._lock:
+            mapped = self._mapped(offset + length)
+        with memoryview(mapped) as view:
+            return str(view[offset:offset + length], "utf-8")
+
+    def reset(self):
+        """Start over with an empty file; existing spans become invalid"""
+        with self._lock:
+            # Swap in a new file rather than truncating: a map still being read
+            # keeps the old one alive instead of faulting past its new end
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "wb"):
+                pass
+            os.replace(temp_path, self.path)
+            self._map = None
+            self._mapped_size = 0
+            self._size = 0
+
+    def size(self):
+        with self._lock:
+            return self._size
@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+
+import telemetry
+from context_packer import pack_passages
+from embeddings import embed_texts
+from rag_ingest import chunk_pages
+from summarizer import document_hash
+from text_utils import normalize_query
+from token_utils import count_tokens
+
+DOC_QA_MODEL = "gpt-4.1-nano"
+DOC_QA_ENCODING = "o200k_base"  # the gpt-4.1 family's tokenizer
+# Documents up to this size go into the prompt whole; larger ones are searched
+MAX_PROMPT_DOCUMENT_TOKENS = 60000
+# Retrieval fallback: chunk size, passages per question and their token budget
+RETRIEVAL_CHUNK_TOKENS = 800
+RETRIEVAL_CHUNK_OVERLAP = 100
+RETRIEVAL_TOP_K = 8
+RETRIEVAL_CONTEXT_TOKENS = 6000
+
+# Never changes, so it leads every request for a document
+DOC_QA_INSTRUCTIONS = (
+    "You answer questions about the document below. Base your answers on the document; "
+    "if it doesn't contain the answer, say so."
+)
+
+RETRIEVAL_INSTRUCTIONS = (
+    "You answer questions about a long document. Only the passages most relevant to the question "
+    "are shown. Base your answers on them; if they don't contain the answer, say so."
+)
+
+
+class DocumentSession:
+    """One uploaded document, decoded and fingerprinted once for many questions.
+
+    A document that fits MAX_PROMPT_DOCUMENT_TOKENS is sent whole as a
+    byte-identical system message ahead of each question, so the provider's
+    prompt cache can reuse the prefix. Larger ones are chunked and embedded
+    once, and each question only sends its best-matching chunks.
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.text = data.decode(errors="ignore")
+        self.doc_hash = document_hash(self.text)
+        self.tokens = count_tokens(self.text, DOC_QA_ENCODING)
+        self.retrieval = self.tokens > MAX_PROMPT_DOCUMENT_TOKENS
+        self.history = []  # [(question, answer)] asked in this session
+        self._chunks = None
+        self._matrix = None
+        # Built once and reused verbatim so the prompt prefix never changes
+        self._prefix = [{"role": "system", "content": f"{DOC_QA_INSTRUCTIONS}\n\n---\n\n{self.text}"}]
+
+    def _index(self, client):
+        """Chunk and embed the document the first time it is searched"""
+        if self._chunks is None:
+            with telemetry.span("lab1.index_document", tokens=self.tokens):
+                self._chunks = [
+                    chunk["text"] for chunk in chunk_pages(
+                        [self.text], RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_CHUNK_OVERLAP, DOC_QA_ENCODING
+                    )
+                ]
+                matrix = np.asarray(embed_texts(client, self._chunks), dtype=np.float32)
+                self._matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return self._chunks, self._matrix
+
+    def remember(self, question, answer):
+        """Record an answer in the history, replacing an earlier ask of the same question"""
+        key = normalize_query(question)
+        self.history = [item for item in self.history if normalize_query(item[0]) != key]
+        self.history.append((question, answer))
+
+    def messages(self, client, question):
+        """Chat messages for a question: the fixed document prefix, then the question"""
+        if not self.retrieval:
+            return self._prefix + [{"role": "user", "content": question}]
+
+        chunks, matrix = self._index(client)
+        query = np.asarray(embed_texts(client, [question])[0], dtype=np.float32)
+        scores = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        best = np.argsort(-scores)[:RETRIEVAL_TOP_K]
+        context, _ = pack_passages(
+            [(f"part {i + 1} of {len(chunks)}", chunks[i]) for i in best],
+            RETRIEVAL_CONTEXT_TOKENS,
+            DOC_QA_ENCODING
+        )
+        return [
+            {"role": "system", "content": RETRIEVAL_INSTRUCTIONS},
+            {"role": "user", "content": f"{context}\n\n---\n\n{question}"}
+        ]
+
+
+def answer_key(doc_hash, question, model):
+    """Cache key for one answer about one document"""
+    return ("answer", doc_hash, normalize_query(question), model)
+
+
+def answer_question(client, session, question, model=DOC_QA_MODEL, cache=None):
+    """Stream an answer, or replay it from the cache.
+
+    Yields text deltas for st.write_stream. A finished answer is stored in the
+    cache and in the session's history.
+    """
+    key = answer_key(session.doc_hash, question, model)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        session.remember(question, cached)
+        yield cached
+        return
+
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=session.messages(client, question),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    usage = None
+    for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+
+    answer = "".join(parts)
+    details = getattr(usage, "prompt_tokens_details", None)
+    telemetry.record(
+        "lab1.answer", (time.perf_counter() - start) * 1000,
+        model=model, retrieval=session.retrieval,
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        cached_prompt_tokens=getattr(details, "cached_tokens", None)
+    )
+    if cache is not None:
+        cache.set(key, answer)
+    session.remember(question, answer)
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+import telemetry
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# The embeddings endpoint accepts up to 2048 inputs per request; stay well under
+# that (and under the per-request token limit) with ~400-token chunks
+EMBED_BATCH_SIZE = 256
+
+EMBEDDING_CACHE_PATH = "./.cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def text_hash(text):
+    """Cache key for a piece of text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent (model, sha256(text)) -> float32 vector cache in SQLite.
+
+    Vectors are stored as packed float32 blobs. When the stored bytes exceed
+    max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        """Look up vectors by text hash; returns {hash: [floats]} for the hits"""
+        found = {}
+        if not hashes:
+            return found
+        now = time.time()
+        with self._lock:
+            # SQLite limits bound parameters, so query in slices
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Store {hash: vector} entries, then evict down to the size budget"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed = []
+        for rowid, size in self._conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            doomed.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide embedding cache shared by every embedding call site"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+def embed_texts(openai_client, texts, model=EMBEDDING_MODEL, batch_size=EMBED_BATCH_SIZE, cache=None):
+    """Embed a list of texts with as few batched requests as possible.
+
+    Vectors already in the embedding cache are reused; only new text is sent
+    to the API. Pass cache=False to bypass the cache.
+    """
+    if cache is None:
+        cache = get_embedding_cache()
+
+    hashes = [text_hash(text) for text in texts]
+    cached = cache.get_many(model, list(set(hashes))) if cache else {}
+    if cache:
+        telemetry.record_cache("embeddings", hits=len(cached), misses=len(set(hashes)) - len(cached))
+
+    # Embed each distinct missing text once
+    missing = {}
+    for key, text in zip(hashes, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    missing_keys = list(missing)
+    fresh = {}
+    for i in range(0, len(missing_keys), batch_size):
+        batch_keys = missing_keys[i:i + batch_size]
+        response = openai_client.embeddings.create(input=[missing[key] for key in batch_keys], model=model)
+        # The API returns one item per input; sort by index to be safe
+        for key, item in zip(batch_keys, sorted(response.data, key=lambda d: d.index)):
+            fresh[key] = item.embedding
+        if cache:
+            cache.put_many(model, {key: fresh[key] for key in batch_keys})
+
+    return [cached[key] if key in cached else fresh[key] for key in hashes]
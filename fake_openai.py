@@ -0,0 +1,230 @@
+"""Local stand-in for the OpenAI and OpenWeatherMap endpoints the labs use.
+
+Serves /v1/models, /v1/embeddings, /v1/chat/completions (plain, JSON mode,
+streaming and tool calls) and /data/2.5/weather with configurable latency, so
+the labs can be exercised offline and without spending API quota:
+
+    python fake_openai.py --port 8089 --latency-ms 300 --token-ms 10
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 \
+    OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8089/data/2.5/ streamlit run streamlit_app.py
+
+Embeddings are hashed bags of words, so texts sharing words land close
+together and retrieval results are stable between runs.
+"""
+import argparse
+import hashlib
+import json
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+FILLER_WORDS = (
+    "the course covers weekly readings hands on labs and a final project graded on clarity "
+    "and depth students should review the syllabus and office hours for details"
+).split()
+
+
+def fake_embedding(text, dims):
+    """Unit vector from hashed words: deterministic and roughly similarity-preserving"""
+    vector = np.zeros(dims, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % dims] += 1.0 if digest[4] & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        vector[0] = norm = 1.0
+    return (vector / norm).round(6).tolist()
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def requested_locations(messages):
+    """Cities named in the last user message, for the weather tool call"""
+    text = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    match = re.search(r"places: (.+?)\. ", text)
+    if match:
+        return [place.strip() for place in match.group(1).split(";") if place.strip()]
+    match = re.search(r" in ([^?]+)\?", text)
+    return [match.group(1).strip()] if match else ["Syracuse, NY"]
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+    config = None  # argparse.Namespace, set by make_server()
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/models"):
+            self._send_json({"object": "list", "data": [
+                {"id": name, "object": "model", "created": 0, "owned_by": "fake"}
+                for name in ("gpt-4o", "gpt-4o-mini", "gpt-3.5-turbo", "text-embedding-3-small")
+            ]})
+        elif url.path.endswith("/weather"):
+            time.sleep(self.config.weather_ms / 1000)
+            city = parse_qs(url.query).get("q", ["Syracuse"])[0]
+            # Stable per-city weather, in Kelvin like the real API
+            seed = int(hashlib.md5(city.lower().encode("utf-8")).hexdigest()[:8], 16)
+            temp = 265.0 + seed % 30
+            self._send_json({
+                "name": city,
+                "main": {"temp": temp, "feels_like": temp - 2, "temp_min": temp - 3, "temp_max": temp + 3,
+                         "humidity": 40 + seed % 50},
+                "weather": [{"main": "Clouds", "description": "scattered clouds"}],
+                "wind": {"speed": seed % 9},
+            })
+        else:
+            self._send_json({"error": {"message": f"Unknown path {url.path}"}}, status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_json()
+        if path.endswith("/embeddings"):
+            self.handle_embeddings(body)
+        elif path.endswith("/chat/completions"):
+            self.handle_chat(body)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {path}"}}, status=404)
+
+    def handle_embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        time.sleep((self.config.latency_ms + self.config.embed_ms_per_input * len(inputs)) / 1000)
+        tokens = sum(estimate_tokens(text) for text in inputs)
+        self._send_json({
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.config.dims)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def chat_reply(self, body):
+        """(content, tool_calls) the fake model answers with"""
+        messages = body.get("messages", [])
+        if body.get("tools") and not any(m.get("role") == "tool" for m in messages):
+            return None, [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {
+                        "name": body["tools"][0]["function"]["name"],
+                        "arguments": json.dumps({"location": location}),
+                    },
+                }
+                for location in requested_locations(messages)
+            ]
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+            return json.dumps({
+                "verdict": "Unclear",
+                "explanation": "Offline benchmark response; no evidence was consulted.",
+                "sources": [],
+                "claim": user.split(":", 1)[-1].strip(),
+            }), None
+        words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(self.config.completion_tokens)]
+        return " ".join(words).capitalize() + ".", None
+
+    def handle_chat(self, body):
+        content, tool_calls = self.chat_reply(body)
+        model = body.get("model", "gpt-4o-mini")
+        prompt_tokens = estimate_tokens(json.dumps(body.get("messages", [])))
+        pieces = re.findall(r"\S+\s*", content) if content else []
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces) or 10,
+                 "total_tokens": prompt_tokens + (len(pieces) or 10)}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": model}
+
+        time.sleep(self.config.latency_ms / 1000)
+        if not body.get("stream"):
+            time.sleep(self.config.token_ms * len(pieces) / 1000)
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": message,
+                             "finish_reason": "tool_calls" if tool_calls else "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, **extra):
+            payload = {**base, "object": "chat.completion.chunk", "choices": choices, **extra}
+            self._send_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.config.token_ms / 1000)
+            event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+def make_server(config, host="127.0.0.1"):
+    """ThreadingHTTPServer serving the fake API; port 0 picks a free port"""
+    handler = type("ConfiguredHandler", (FakeAPIHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, config.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300, help="time to first token / response headers")
+    parser.add_argument("--token-ms", type=float, default=10, help="delay per generated token")
+    parser.add_argument("--embed-ms-per-input", type=float, default=0.2, help="extra embedding latency per input")
+    parser.add_argument("--weather-ms", type=float, default=150, help="weather API latency")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="length of plain chat replies")
+    parser.add_argument("--dims", type=int, default=1536, help="embedding dimensions")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser
+
+
+def main():
+    config = build_parser().parse_args()
+    server = make_server(config)
+    print(f"Fake OpenAI/OpenWeatherMap API on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+
+
+class JSONObjectStream:
+    """Incremental parser for a JSON object arriving in text deltas.
+
+    feed() returns the top-level (key, value) members completed by a delta,
+    so each field can be shown as soon as its value closes rather than when
+    the whole object has been generated. Nested arrays and objects are
+    returned whole once they close. A member that isn't valid JSON is skipped
+    instead of raising, and result() reports what was missing.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._text = ""
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._closed = False
+        self._is_object = False
+        self._bad_members = 0
+
+    def feed(self, delta):
+        """Add a text delta; returns the [(key, value)] members it completed"""
+        self._text += delta
+        completed = []
+        while self._scanned < len(self._text) and not self._closed:
+            i = self._scanned
+            char = self._text[i]
+            self._scanned += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Text before the opening brace is ignored, quotes included
+                self._in_string = self._depth > 0
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._is_object = char == "{"
+                    self._member_start = i + 1
+            elif char in "}]" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._end_member(i))
+                    self._closed = True
+            elif char == "," and self._depth == 1:
+                completed.extend(self._end_member(i))
+                self._member_start = i + 1
+        return completed
+
+    def _end_member(self, end):
+        member = self._text[self._member_start:end].strip()
+        if not member or not self._is_object:
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except ValueError:
+            self._bad_members += 1
+            return []
+        self.fields.update(parsed)
+        return list(parsed.items())
+
+    def result(self):
+        """(fields, error): everything parsed so far, and None or what went wrong"""
+        try:
+            parsed = json.loads(self._text)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            return parsed, None
+        if self._closed and not self._is_object:
+            return {}, "The response was not a JSON object"
+        if not self._closed:
+            return dict(self.fields), "The response was cut off before the JSON object ended"
+        if self._bad_members:
+            return dict(self.fields), f"Skipped {self._bad_members} malformed field(s) in the response"
+        # A complete object wrapped in other text (e.g. a code fence) is still usable
+        return dict(self.fields), None
+
+
+def parse_json_object(text):
+    """(fields, error) for a complete response, salvaging what it can like JSONObjectStream"""
+    stream = JSONObjectStream()
+    stream.feed(text or "")
+    return stream.result()
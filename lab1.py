@@ -1,5 +1,8 @@
 import streamlit as st
-from openai import OpenAI
+
+from doc_session import DOC_QA_MODEL, DocumentSession, answer_key, answer_question
+from llm_gateway import get_openai_client, validate_api_key
+from resources import get_answer_cache
 
 # Show title and description.
 st.title("📄 Nikita's Document QA Lab 1")
@@ -18,13 +21,13 @@ key_valid = False
 if not openai_api_key:
     st.info("Please add your OpenAI API key to continue.", icon="🗝️")
 else:
-    try:
-        # Immediate validation
-        OpenAI(api_key=openai_api_key).models.list()
+    # Immediate validation (cached, so reruns don't hit the API)
+    key_error = validate_api_key(openai_api_key)
+    if key_error is None:
         st.success("API key is valid ✅")
         key_valid = True
-    except Exception as e:
-        st.error(f"Invalid API key. {e}")
+    else:
+        st.error(key_error)
 
 uploaded_file = st.file_uploader(
     "Upload a document (.txt or .md)", type=("txt", "md"), disabled=not key_valid
@@ -36,19 +39,33 @@ question = st.text_area(
     disabled=(not key_valid or not uploaded_file),
 )
 
+# Decode and fingerprint each upload once; reruns and later questions reuse it
+session = st.session_state.get("doc_session")
+if uploaded_file and (session is None or st.session_state.get("doc_file_id") != uploaded_file.file_id):
+    session = DocumentSession(uploaded_file.name, uploaded_file.getvalue())
+    st.session_state.doc_session = session
+    st.session_state.doc_file_id = uploaded_file.file_id
+
+if session is not None and uploaded_file:
+    if session.retrieval:
+        st.caption(
+            f"{session.name} is {session.tokens:,} tokens, too long to send whole; "
+            "each question is answered from its most relevant passages."
+        )
+    else:
+        st.caption(f"{session.name}: {session.tokens:,} tokens")
+
 if key_valid and uploaded_file and question:
-    # Create an OpenAI client.
-    client = OpenAI(api_key=openai_api_key)
+    # Shared OpenAI client for this key.
+    client = get_openai_client(openai_api_key)
+    answer_cache = get_answer_cache()
     
-    # Let the user upload a file via `st.file_uploader`.
-    document = uploaded_file.read().decode(errors="ignore")
-    messages = [
-        {"role": "user", "content": f"Here's a document: {document}\n\n---\n\n{question}"}
-    ]
-
-    stream = client.chat.completions.create(
-        model="gpt-4.1-nano",
-        messages=messages,
-        stream=True,
-    )
-    st.write_stream(stream)
+    if answer_cache.peek(answer_key(session.doc_hash, question, DOC_QA_MODEL)) is not None:
+        st.caption("♻️ Cached answer")
+    st.write_stream(answer_question(client, session, question, model=DOC_QA_MODEL, cache=answer_cache))
+
+if session is not None and uploaded_file and len(session.history) > 1:
+    with st.expander("Earlier questions about this document"):
+        for earlier_question, earlier_answer in reversed(session.history[:-1]):
+            st.markdown(f"**{earlier_question}**")
+            st.markdown(earlier_answer)
@@ -1,5 +1,13 @@
 import streamlit as st
-from openai import OpenAI
+
+from llm_gateway import get_openai_client, validate_api_key
+from resources import get_background_executor, get_summary_cache
+from summarizer import (
+    SUMMARY_FORMATS, cached_variant, document_hash, precompute_summaries, summarize_document, summary_key,
+    translate_summary
+)
+
+LANGUAGES = ["English", "Spanish", "French", "German", "Chinese", "Kannada"]
 
 # Show title and description.
 st.title("📄 Nikita's Document Summarizer Lab 2")
@@ -8,12 +16,12 @@ openai_api_key = st.secrets["OPENAI_API_KEY"]
 
 summary_type = st.selectbox(
         "Select Summary Type",
-        ["100 Words", "2 Paragraphs", "5 Bullet Points"]
+        list(SUMMARY_FORMATS)
     )
 
 language = st.sidebar.selectbox(
         "Select Language",
-        ["English", "Spanish", "French", "German", "Chinese", "Kannada"]
+        LANGUAGES
     )
 st.sidebar.write(f"Language selected: {language}")
 
@@ -26,13 +34,13 @@ model = "gpt-4" if use_advanced_model else "gpt-4.1-nano"
     
 key_valid = False
 if openai_api_key:
-    try:
-        client = OpenAI(api_key=openai_api_key)
-        client.models.list()  
+    client = get_openai_client(openai_api_key)
+    key_error = validate_api_key(openai_api_key)
+    if key_error is None:
         st.success("API key is valid ✅")
         key_valid = True
-    except Exception as e:
-        st.error(f"Invalid API key. {e}")
+    else:
+        st.error(key_error)
 else:
     st.info("No OpenAI API key", icon="🗝️")
 
@@ -49,22 +57,43 @@ if uploaded_file:
 openai_api_key = st.secrets["OPENAI_API_KEY"]
 
 if key_valid and uploaded_file and document:
-        if summary_type == "100 Words":
-            prompt = f"Summarize the document in 100 words: {document}"
-        elif summary_type == "2 Paragraphs":
-            prompt = f"Summarize the document in 2 paragraphs: {document}"
-        else:
-            prompt = f"Summarize the document in 5 bullet points: {document}"
-
-        messages = [{"role": "user", "content": prompt}]
-        
+        summary_cache = get_summary_cache()
+        doc_hash = document_hash(document)
+        key = summary_key(doc_hash, summary_type, language, model)
+        other_languages = [other for other in LANGUAGES if other != language]
         try:
-            stream = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                stream=True,
+            summary = summary_cache.get(key)
+            pending = summary_cache.in_flight(key)
+            if summary is not None:
+                st.caption("♻️ Cached summary")
+                st.markdown(summary)
+            elif pending is not None:
+                # Already being precomputed in the background; wait for that instead of starting over
+                with st.spinner("Summarizing..."):
+                    try:
+                        summary = pending.result()
+                    except Exception:
+                        summary = None  # the precompute failed; generate it below instead
+                if summary is not None:
+                    st.markdown(summary)
+            if summary is None:
+                # Same summary in another language: translating it is cheaper than re-reading the document
+                translated_from = cached_variant(summary_cache, doc_hash, summary_type, model, other_languages)
+                with st.spinner("Summarizing..."):
+                    if translated_from is not None:
+                        stream = translate_summary(client, model, translated_from, language)
+                    else:
+                        # Long documents are summarized in parallel chunks, then merged; the final pass streams
+                        stream = summarize_document(client, model, document, summary_type, language, summary_cache)
+                    summary = st.write_stream(stream)
+                summary_cache.set(key, summary)
+            
+            # Speculatively prepare the other summary types while the user reads this one
+            get_background_executor().submit(
+                precompute_summaries, client, model, document,
+                [other for other in SUMMARY_FORMATS if other != summary_type], language, summary_cache,
+                other_languages
             )
-            st.write_stream(stream)
         except Exception as e:
             st.error(f"Error: {e}")
 
@@ -1,5 +1,8 @@
 import streamlit as st
-from openai import OpenAI
+
+from conversation_memory import ConversationMemory, summarize_conversation
+from llm_gateway import get_openai_client
+from resources import get_background_executor
 
 # Show title and description.
 st.title("📄 Nikita's ChatBot Lab 3")
@@ -9,31 +12,45 @@ openai_api_key = st.secrets["OPENAI_API_KEY"]
 openAI_model = st.sidebar.selectbox("Which Model?",("mini","regular"))
 model = "gpt-4o" if openAI_model == "regular" else "gpt-4o-mini"
 
+# Prompt size per turn; older turns are summarized to stay under it
+context_budget = st.sidebar.number_input("Context budget (tokens)", min_value=500, max_value=16000, value=2000, step=250)
+
+# Summaries always use the small model; they run in the background
+summary_model = "gpt-4o-mini"
     
-if 'client' not in st.session_state:
-    st.session_state.client = OpenAI(api_key=openai_api_key)
+client = get_openai_client(openai_api_key)
 
 if "messages" not in st.session_state:
     st.session_state["messages"] = [{"role": "assistant", "content": "How can I help you?"}]
 
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(budget_tokens=context_budget)
+    st.session_state.memory.add("assistant", "How can I help you?")
+
+memory = st.session_state.memory
+memory.budget_tokens = context_budget
+
 for msg in st.session_state.messages:
     chat_msg = st.chat_message(msg["role"])
     chat_msg.write(msg["content"])
 
 if prompt := st.chat_input("What is up?"):
     if prompt == "no":
-        st.session_state.messages.append({"role": "user", "content": "ask me WHAT ELSE CAN I HELP YOU WITH?"})
+        user_content = "ask me WHAT ELSE CAN I HELP YOU WITH?"
     else: 
-        st.session_state.messages.append({"role": "user", "content": prompt+"After answering ask me DO YOU WANT MORE INFO?"})
+        user_content = prompt+"After answering ask me DO YOU WANT MORE INFO?"
+    st.session_state.messages.append({"role": "user", "content": user_content})
+    memory.add("user", user_content)
 
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    client = st.session_state.client
     stream = client.chat.completions.create(
         model = model,
-        messages = st.session_state.messages,
-        stream = True
+        messages = memory.messages(),
+        stream = True,
+        # Final chunk carries token usage, which the gateway records
+        stream_options = {"include_usage": True}
     )
 
     response = "response"
@@ -42,7 +59,15 @@ if prompt := st.chat_input("What is up?"):
         response = st.write_stream(stream)
 
     st.session_state.messages.append({"role": "assistant", "content": response})
+    memory.add("assistant", response)
+
+    # Fold older turns into the rolling summary off the critical path
+    memory.maybe_summarize(
+        get_background_executor(),
+        lambda summary, messages: summarize_conversation(client, summary_model, summary, messages)
+    )
 
-    # Keep initial message + last 2 conversation messages  
-    if len(st.session_state.messages) > 3:  
-        st.session_state.messages = [st.session_state.messages[0]] + st.session_state.messages[-2:]                                                                          
\ No newline at end of file
+st.sidebar.caption(f"Next prompt: ~{memory.tokens()} tokens of {context_budget}")
+if memory.summary:
+    with st.sidebar.expander("Conversation summary"):
+        st.write(memory.summary)
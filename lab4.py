@@ -1,167 +1,460 @@
 import streamlit as st
-from openai import OpenAI
 from bs4 import BeautifulSoup
 import PyPDF2
 import os
+import threading
+import time
+import uuid
 
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-
-import chromadb
+import telemetry
+from bm25_index import reciprocal_rank_fusion
+from context_packer import mmr_select, pack_passages
+from embeddings import EMBED_BATCH_SIZE, EMBEDDING_MODEL, embed_texts, get_embedding_cache
+from llm_gateway import get_openai_client
+from rag_ingest import (
+    IngestProgress, chunk_id, chunk_pages, iter_pdf_pages, load_manifest, manifest_path, plan_sync, save_manifest
+)
+from resources import (
+    bump_collection_version, get_bm25_index, get_collection_version, get_corpus_store, get_lab4_index_state,
+    get_lab4_store, get_namespace_registry, get_query_embedding_cache, get_retrieval_cache
+)
+from text_utils import normalize_query
+from vector_store import VECTOR_BACKENDS
 
 # Show title and description.
 st.title("# Nikita's Lab 4 - RAG Chatbot")
 
-chromadb_path = "./ChromaDB_for_lab"
-
-chroma_client = chromadb.PersistentClient(path=chromadb_path)
+# Vector store backend, one of VECTOR_BACKENDS; the numpy ones skip ChromaDB entirely
+vector_backend = os.environ.get("VECTOR_BACKEND", "chroma")
+if vector_backend not in VECTOR_BACKENDS:
+    st.error(f"Unknown VECTOR_BACKEND {vector_backend!r}; using chroma")
+    vector_backend = "chroma"
 
-# Initialize clients
-openai_api_key = st.secrets["OPENAI_API_KEY"]
+# Retrieval modes for search_vectordb; hybrid fuses vector and BM25 rankings
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+# How many candidates each retriever contributes before fusion, per requested result
+CANDIDATE_MULTIPLIER = 4
+# Context assembly: retrieval returns RAG_CANDIDATES passages, MMR picks up to
+# MAX_CONTEXT_PASSAGES relevant but non-redundant ones (1.0 = relevance only),
+# and they are packed into CONTEXT_TOKEN_BUDGET tokens of the answering model
+RAG_MODEL = "gpt-4o-mini"
+RAG_ENCODING = "o200k_base"  # gpt-4o-mini's tokenizer
+RAG_CANDIDATES = 20
+MAX_CONTEXT_PASSAGES = 8
+MMR_LAMBDA = 0.5
+CONTEXT_TOKEN_BUDGET = 2500
+# How often the ingestion progress bar refreshes while the background sync runs
+INGESTION_REFRESH_SECONDS = 2
+# A sync that ended with errors is retried by the next session after this
+# many seconds, doubling with each failure in a row up to the maximum
+INGESTION_RETRY_SECONDS = 30
+INGESTION_RETRY_MAX_SECONDS = 15 * 60
 
-if 'openai_client' not in st.session_state:
-    st.session_state.openai_client = OpenAI(api_key=openai_api_key)
+# Prefix for chunk ids of private uploads, so they never collide with shared ones
+UPLOAD_ID_PREFIX = "upload:"
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-def add_to_collection(collection, text, filename):
-    """Add a document to the ChromaDB collection with OpenAI embeddings"""
-    openai_client = st.session_state.openai_client
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
+# Key of this session's private upload namespace (there are no user accounts)
+if "namespace" not in st.session_state:
+    st.session_state.namespace = uuid.uuid4().hex
 
-    embedding = response.data[0].embedding
+def get_corpus(collection):
+    """Chunk text for a vector store, kept beside it in an append-only file"""
+    return get_corpus_store(os.path.join(collection.path, f"{collection.name}.corpus"))
 
-    collection.add(
-        documents=[text],
-        ids=[filename],
-        embeddings=[embedding],
-        metadatas=[{"filename": filename}]
+def add_to_collection(collection, chunks):
+    """Embed chunks in batched requests and upsert them into the vector store.
+
+    Each chunk is a dict with "id", "text" and "metadata". The text goes to
+    the corpus file; the vector store only keeps its byte span.
+    """
+    openai_client = get_openai_client()
+    texts = [chunk["text"] for chunk in chunks]
+    embeddings = embed_texts(openai_client, texts, model=EMBEDDING_MODEL)
+    spans = get_corpus(collection).append(texts)
+
+    with telemetry.span("vectorstore.upsert", backend=collection.backend, chunks=len(chunks)):
+        collection.upsert(
+            ids=[chunk["id"] for chunk in chunks],
+            embeddings=embeddings,
+            metadatas=[
+                {**chunk["metadata"], "text_offset": offset, "text_length": length}
+                for chunk, (offset, length) in zip(chunks, spans)
+            ]
+        )
+    get_bm25_index(collection.name).add(
+        [chunk["id"] for chunk in chunks],
+        texts,
+        [chunk["metadata"]["filename"] for chunk in chunks]
     )
 
-def extract_text_from_pdf_file(file_obj):
-    """Extract text from PDF file object"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(file_obj)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        st.error(f"Error reading PDF: {e}")
-        return ""
+def remove_file_from_collection(collection, filename):
+    """Delete every chunk of a file from the collection and its lexical index"""
+    collection.delete_file(filename)
+    get_bm25_index(collection.name).remove_file(filename)
+
+def load_bm25_index(collection, page_size=1000):
+    """Build the lexical index from chunks already stored in the collection"""
+    index = get_bm25_index(collection.name)
+    if len(index) > 0:
+        return index
+    corpus = get_corpus(collection)
+    for ids, documents, metadatas in collection.iter_records(page_size):
+        texts = [
+            corpus.read(metadata["text_offset"], metadata["text_length"])
+            if metadata and "text_offset" in metadata else document or ""
+            for document, metadata in zip(documents, metadatas)
+        ]
+        index.add(ids, texts, [(metadata or {}).get("filename") for metadata in metadatas])
+    return index
+
+def chunk_pdf_pages(pages, filename):
+    """Turn a PDF's page texts into collection-ready chunk records"""
+    records = []
+    for i, chunk in enumerate(chunk_pages(pages)):
+        records.append({
+            "id": chunk_id(filename, i),
+            "text": chunk["text"],
+            "metadata": {
+                "filename": filename,
+                "chunk": i,
+                "page": chunk["page"],
+                "page_end": chunk["page_end"],
+                "start": chunk["start"],
+                "end": chunk["end"],
+            },
+        })
+    return records
+
+def add_uploads(namespace, uploads):
+    """Chunk, embed and store uploaded PDFs in a private namespace.
 
-def create_lab4_vectordb():
-    """Create ChromaDB collection and populate with PDF documents from local directory"""
+    Files the namespace already has are skipped. Returns the number of chunks added.
+    """
+    added = 0
+    for upload in uploads:
+        if upload.name in namespace.files:
+            continue
+        try:
+            with telemetry.span("lab4.upload", size=upload.size):
+                pages = [page.extract_text() or "" for page in PyPDF2.PdfReader(upload).pages]
+                chunks = chunk_pdf_pages(pages, upload.name)
+                for chunk in chunks:
+                    chunk["id"] = UPLOAD_ID_PREFIX + chunk["id"]
+                if not chunks:
+                    st.warning(f"No text found in {upload.name}")
+                    continue
+                texts = [chunk["text"] for chunk in chunks]
+                namespace.add(chunks, embed_texts(get_openai_client(), texts, model=EMBEDDING_MODEL))
+                added += len(chunks)
+        except Exception as e:
+            st.error(f"Error adding {upload.name}: {e}")
+    if added:
+        get_namespace_registry().rebalance()
+    return added
+
+def create_lab4_vectordb(progress=None):
+    """Sync the Lab 4 vector store with the PDF directory.
+
+    Only new or changed PDFs are parsed and embedded; vectors for deleted
+    files are removed. An unchanged corpus costs no parsing and no embedding calls.
+    Status and errors are reported through an IngestProgress rather than the
+    page, so the sync can run on a background thread.
+    """
+    if progress is None:
+        progress = IngestProgress()
     try:
-        collection = chroma_client.get_or_create_collection(
-            name="Lab4Collection",
-            metadata={"hnsw:space": "cosine"}
-        )
-        
-        st.write("📁 Loading PDF files from repository...")
+        collection = get_lab4_store(vector_backend)
         
         pdf_directory = "./pdfs"
+        manifest_file = manifest_path(collection.path)
+        manifest = load_manifest(manifest_file)
+        # Files stored before the corpus file existed keep their text in the
+        # vector store; sync them again so they move over
+        manifest = {name: entry for name, entry in manifest.items() if entry.get("corpus")}
         
-        pdf_files = []
-        pdf_path = None
+        # A manifest without vectors (e.g. the DB was wiped) must not skip ingestion,
+        # and an empty store starts a fresh corpus file rather than appending to stale text
+        if collection.count() == 0:
+            manifest = {}
+            get_corpus(collection).reset()
         
-        if os.path.exists(pdf_directory):
-            files = [f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf')]
-            if files:
-                pdf_files = files
-                pdf_path = pdf_directory
+        plan = plan_sync(pdf_directory, manifest)
+        total_files = len(plan["changed"]) + len(plan["unchanged"]) + len(plan["touched"])
         
-        if not pdf_files:
-            st.error("No PDF files found in the repository. Please check the file paths.")
+        if total_files == 0:
+            progress.error("No PDF files found in the repository. Please check the file paths.")
+            progress.finish()
             return None
         
-        st.write(f"Found {len(pdf_files)} PDF files in: `{pdf_path}`")
+        progress.start(
+            plan["changed"],
+            f"Found {total_files} PDF files in `{pdf_directory}` "
+            f"({len(plan['changed'])} to embed, {len(plan['deleted'])} removed)"
+        )
+        
+        # Remove vectors for files that no longer exist
+        for pdf_filename in plan["deleted"]:
+            try:
+                remove_file_from_collection(collection, pdf_filename)
+                del manifest[pdf_filename]
+            except Exception as e:
+                progress.error(f"Error removing {pdf_filename}: {e}")
+        if plan["deleted"]:
+            bump_collection_version(collection.name)
+        
+        # Same content, new timestamp: only the manifest needs updating
+        for pdf_filename, fingerprint in plan["touched"].items():
+            manifest[pdf_filename] = {**manifest[pdf_filename], **fingerprint}
+        
+        # Chunks from several files are pooled so each embeddings request is a full batch
+        pending_chunks = []
+        pending_files = {}
+        
+        def flush_pending():
+            """Embed the pooled chunks; files only enter the manifest once stored"""
+            count = 0
+            try:
+                if pending_chunks:
+                    add_to_collection(collection, pending_chunks)
+                for filename, entry in pending_files.items():
+                    manifest[filename] = entry
+                count = len(pending_files)
+            except Exception as e:
+                # Files left out of the manifest are retried on the next sync
+                progress.error(f"Error embedding {', '.join(pending_files)}: {e}")
+            # Save after every batch so an interrupted sync resumes where it stopped
+            save_manifest(manifest_file, manifest)
+            bump_collection_version(collection.name)
+            for entry in pending_files.values():
+                progress.file_done(entry["size"], entry["chunks"] if count else 0, failed=not count)
+            pending_chunks.clear()
+            pending_files.clear()
+            return count
         
         processed_count = 0
-        for pdf_filename in pdf_files:
-            pdf_file_path = os.path.join(pdf_path, pdf_filename)
+        changed_paths = [os.path.join(pdf_directory, name) for name in plan["changed"]]
+        # PDFs are parsed across a process pool and arrive here as each one finishes
+        for pdf_file_path, pages, error in iter_pdf_pages(changed_paths):
+            pdf_filename = os.path.basename(pdf_file_path)
+            fingerprint = plan["changed"][pdf_filename]
             
             try:
-                with open(pdf_file_path, 'rb') as file:
-                    text_content = extract_text_from_pdf_file(file)
+                if error is not None:
+                    raise error
                 
-                if text_content.strip(): 
-                    # Add to collection
-                    add_to_collection(collection, text_content, pdf_filename)
-                    processed_count += 1
+                chunks = chunk_pdf_pages(pages, pdf_filename)
+                # Drop the file's old chunks; the new version may have fewer, or none
+                remove_file_from_collection(collection, pdf_filename)
+                if chunks:
+                    pending_chunks.extend(chunks)
+                    pending_files[pdf_filename] = {**fingerprint, "chunks": len(chunks), "corpus": True}
+                else:
+                    # Recorded so a PDF without text isn't parsed again on every sync;
+                    # the next flush saves the manifest
+                    manifest[pdf_filename] = {**fingerprint, "chunks": 0, "corpus": True}
+                    progress.file_done(fingerprint["size"])
                     
             except Exception as e:
-                st.error(f"Error processing {pdf_filename}: {e}")
+                progress.error(f"Error processing {pdf_filename}: {e}")
+                progress.file_done(fingerprint["size"], failed=True)
+            
+            if len(pending_chunks) >= EMBED_BATCH_SIZE:
+                processed_count += flush_pending()
         
-        st.success(f"Successfully processed {processed_count}/{len(pdf_files)} PDF files!")
+        processed_count += flush_pending()
+        
+        progress.finish(
+            f"Embedded {processed_count}/{len(plan['changed'])} new or changed PDF files "
+            f"({len(plan['unchanged']) + len(plan['touched'])} unchanged)."
+        )
         return collection
             
     except Exception as e:
-        st.error(f"Error creating vector database: {e}")
+        progress.error(f"Error creating vector database: {e}")
+        progress.finish()
         return None
 
-def search_vectordb(collection, query, top_k=3):
-    """Search the vector database and return relevant documents"""
+def embed_query(query):
+    """Query embedding, reused for repeated or trivially reworded questions"""
+    openai_client = get_openai_client()
+    return get_query_embedding_cache().get_or_compute(
+        normalize_query(query),
+        lambda: embed_texts(openai_client, [query], model=EMBEDDING_MODEL)[0]
+    )
+
+def search_vectordb(collection, query, top_k=5, mode="hybrid", namespace=None):
+    """Search the vector database and return the most relevant passages.
+
+    Hits carry ids, scores and the byte span of their text in the corpus file,
+    not the text itself; load_passages() reads it for the ones that are used.
+    mode is "vector" (dense only), "lexical" (BM25 only) or "hybrid" (both,
+    fused with reciprocal rank fusion). Results are cached per collection
+    version, so a repeat question skips both the embedding call and the search
+    until ingestion changes the collection.
+    
+    With a namespace, the session's private uploads are searched too and both
+    rankings are fused; private hits are marked with 'private' and not cached.
+    """
     if collection is None:
         return []
     
     try:
-        openai_client = st.session_state.openai_client
-        
-        # Create embedding for search query
-        response = openai_client.embeddings.create(
-            input=query,
-            model="text-embedding-3-small"
-        )
-        query_embedding = response.data[0].embedding
-        
-        # Search the collection
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k
-        )
-        
-        # Format results
-        relevant_docs = []
-        if results['ids'] and len(results['ids'][0]) > 0:
-            for i, doc_id in enumerate(results['ids'][0]):
-                document = results['documents'][0][i]
-                distance = results['distances'][0][i] if 'distances' in results else 0
-                similarity_score = 1 - distance
-                
-                relevant_docs.append({
-                    'filename': doc_id,
-                    'content': document,
-                    'similarity': similarity_score
-                })
-        
-        return relevant_docs
-            
+        cache_key = (collection.name, get_collection_version(collection.name), normalize_query(query), top_k, mode)
+        with telemetry.span("lab4.search", mode=mode):
+            shared = get_retrieval_cache().get_or_compute(
+                cache_key,
+                lambda: _search_collection(collection, query, top_k, mode)
+            )
+        if namespace is None or not namespace.count():
+            return shared
+        with telemetry.span("lab4.namespace_search", mode=mode, chunks=namespace.count()):
+            private = _search_collection(namespace.store, query, top_k, mode, bm25=namespace.bm25)
+        hits = {hit['id']: hit for hit in shared}
+        hits.update((hit['id'], {**hit, 'private': True}) for hit in private)
+        ranked = reciprocal_rank_fusion([[hit['id'] for hit in shared], [hit['id'] for hit in private]])
+        return [{**hits[doc_id], 'score': score} for doc_id, score in ranked[:top_k]]
     except Exception as e:
         st.error(f"Error during search: {e}")
         return []
 
-def generate_rag_response(user_query, relevant_docs):
-    """Generate response using RAG - combine retrieved documents with LLM"""
-    openai_client = st.session_state.openai_client
+def _format_hit(doc_id, metadata, similarity=None, score=None):
+    metadata = metadata or {}
+    return {
+        'id': doc_id,
+        'filename': metadata.get('filename', doc_id),
+        'page': metadata.get('page'),
+        'offset': metadata.get('text_offset'),
+        'length': metadata.get('text_length'),
+        'similarity': similarity,
+        'score': similarity if score is None else score
+    }
+
+def _vector_search(collection, query, n_results):
+    """Dense search over the collection"""
+    query_embedding = embed_query(query)
+    
+    # Search the collection
+    with telemetry.span("vectorstore.query", backend=collection.backend, n_results=n_results):
+        results = collection.query(query_embedding, n_results)
+    
+    # Format results
+    return [
+        _format_hit(doc_id, metadata, similarity=similarity)
+        for doc_id, metadata, similarity in results
+    ]
+
+def _search_collection(collection, query, top_k, mode, bm25=None):
+    """Uncached search in the given retrieval mode.
+
+    bm25 defaults to the shared lexical index kept for the collection.
+    """
+    if mode == "vector":
+        return _vector_search(collection, query, top_k)
     
-    context_parts = []
+    n_candidates = top_k * CANDIDATE_MULTIPLIER
+    with telemetry.span("bm25.search"):
+        lexical = (bm25 if bm25 is not None else get_bm25_index(collection.name)).search(query, n_candidates)
+    if mode == "lexical":
+        ranked = lexical[:top_k]
+        dense_hits = {}
+    else:
+        dense = _vector_search(collection, query, n_candidates)
+        dense_hits = {hit['id']: hit for hit in dense}
+        ranked = reciprocal_rank_fusion([
+            [hit['id'] for hit in dense],
+            [doc_id for doc_id, _ in lexical]
+        ])[:top_k]
+    
+    # Lexical-only hits still need their metadata from the collection
+    missing = [doc_id for doc_id, _ in ranked if doc_id not in dense_hits]
+    fetched = {}
+    if missing:
+        for doc_id, _, metadata in collection.get(missing):
+            fetched[doc_id] = metadata
+    
+    relevant_docs = []
+    for doc_id, score in ranked:
+        if doc_id in dense_hits:
+            relevant_docs.append({**dense_hits[doc_id], 'score': score})
+        elif doc_id in fetched:
+            relevant_docs.append(_format_hit(doc_id, fetched[doc_id], score=score))
+    return relevant_docs
+
+def _by_store(collection, namespace, docs):
+    """Split hits into [(store, corpus, docs)] by where they are stored"""
+    groups = [(collection, get_corpus(collection), [doc for doc in docs if not doc.get('private')])]
+    if namespace is not None:
+        groups.append((namespace.store, namespace.corpus, [doc for doc in docs if doc.get('private')]))
+    return [group for group in groups if group[2]]
+
+def select_passages(collection, query, candidates, max_passages=MAX_CONTEXT_PASSAGES,
+                    lambda_mult=MMR_LAMBDA, namespace=None):
+    """Relevant but mutually diverse passages from the candidates, in pick order (MMR).
+
+    Candidate vectors are read back from the vector store (or the namespace's,
+    for private hits), so no text is loaded and no API call is made.
+    """
+    if len(candidates) <= 1:
+        return candidates
+    try:
+        with telemetry.span("lab4.mmr", candidates=len(candidates)):
+            vectors = {}
+            for store, _, docs in _by_store(collection, namespace, candidates):
+                vectors.update(store.vectors([doc['id'] for doc in docs]))
+            candidates = [doc for doc in candidates if doc['id'] in vectors]
+            order = mmr_select(
+                embed_query(query), [vectors[doc['id']] for doc in candidates], max_passages, lambda_mult
+            )
+    except Exception:
+        # Fall back to the retrieval ranking
+        return candidates[:max_passages]
+    return [candidates[i] for i in order]
+
+def load_passages(collection, docs, namespace=None):
+    """Copies of the hits with their text ("content") sliced from the corpus file"""
+    text = {}
+    for store, corpus, group in _by_store(collection, namespace, docs):
+        for doc in group:
+            if doc.get('offset') is not None:
+                text[doc['id']] = corpus.read(doc['offset'], doc['length'])
+        # Chunks stored before the corpus file existed still have their text in the vector store
+        legacy = [doc['id'] for doc in group if doc.get('offset') is None]
+        if legacy:
+            text.update((doc_id, document or "") for doc_id, document, _ in store.get(legacy, include_documents=True))
+    return [{**doc, 'content': text.get(doc['id'], "")} for doc in docs]
+
+def _location(doc):
+    return f"{doc['filename']}, page {doc['page']}" if doc.get('page') else doc['filename']
+
+def generate_rag_response(user_query, relevant_docs, budget_tokens=CONTEXT_TOKEN_BUDGET):
+    """Generate response using RAG - combine retrieved documents with LLM.
+
+    relevant_docs are in priority order (see select_passages); as many as fit
+    in budget_tokens go into the prompt. Yields the answer text as it streams
+    in, followed by the sources block, so it can be passed straight to
+    st.write_stream.
+    """
+    openai_client = get_openai_client()
+    
+    context = ""
     source_info = []
     
     if relevant_docs:
-        context_parts.append("Here is relevant information from the knowledge base:")
-        for i, doc in enumerate(relevant_docs):
-            context_parts.append(f"\n--- Document {i+1}: {doc['filename']} ---")
-            context_parts.append(doc['content'][:1500])  # Limit content length
-            source_info.append(f"• {doc['filename']} (similarity: {doc['similarity']:.3f})")
-    
-    context = "\n".join(context_parts)
+        passages, used = pack_passages(
+            [(_location(doc), doc['content']) for doc in relevant_docs], budget_tokens, RAG_ENCODING
+        )
+        if used:
+            context = "Here is relevant information from the knowledge base:\n\n" + passages
+        relevant_docs = [relevant_docs[i] for i in used]
+        for doc in relevant_docs:
+            if doc.get('similarity') is not None:
+                source_info.append(f"• {_location(doc)} (similarity: {doc['similarity']:.3f})")
+            else:
+                source_info.append(f"• {_location(doc)} (keyword match)")
     
     system_prompt = """You are a helpful AI assistant chatbot that answers questions based on the provided documents. 
 
@@ -179,64 +472,178 @@ IMPORTANT INSTRUCTIONS:
 Please provide a helpful response to the user's question."""
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",  
+        stream = openai_client.chat.completions.create(
+            model=RAG_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            max_tokens=1000
+            max_tokens=1000,
+            stream=True,
+            # Final chunk carries token usage for telemetry
+            stream_options={"include_usage": True}
         )
         
-        assistant_response = response.choices[0].message.content
-        
-        # Add source information if documents were used
-        if relevant_docs and len(relevant_docs) > 0:
-            assistant_response += f"\n\n📚 **Sources consulted:**\n" + "\n".join(source_info)
-        
-        return assistant_response
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
         
     except Exception as e:
-        return f"Sorry, I encountered an error while generating a response: {e}"
+        yield f"Sorry, I encountered an error while generating a response: {e}"
+        return
+    
+    # Add source information once the answer has finished streaming
+    if relevant_docs and len(relevant_docs) > 0:
+        yield f"\n\n📚 **Sources consulted:**\n" + "\n".join(source_info)
 
-def main():
-    # Initialize vector database
-    if 'Lab4_vectorDB' not in st.session_state:
-        st.write("Setting up vector database...")
-        
-        with st.spinner("Loading documents into ChromaDB..."):
-            collection = create_lab4_vectordb()
-            if collection is not None:
-                st.session_state.Lab4_vectorDB = collection
-                st.success("✅ Vector database ready!")
-                st.rerun() 
-    else:
-        st.markdown("## 💬 Chat with your Documents")
-        st.markdown("Ask questions about the documents in your knowledge base!")
-        
-        # Display chat messages from history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-        
-        # Chat input
-        if prompt := st.chat_input("Ask me anything about the documents"):
-            st.session_state.messages.append({"role": "user", "content": prompt})
-            with st.chat_message("user"):
-                st.markdown(prompt)
+def _sync_due(state):
+    """Whether to start a sync: none has run yet, or the last one failed and its backoff is over"""
+    previous = state["progress"]
+    if previous is None:
+        return True
+    snapshot = previous.snapshot()
+    if snapshot["running"]:
+        return False
+    if not snapshot["errors"] and not snapshot["files_failed"]:
+        state["failures"] = 0
+        return False
+    backoff = min(INGESTION_RETRY_SECONDS * 2 ** state["failures"], INGESTION_RETRY_MAX_SECONDS)
+    return previous.clock() - previous.finished_at >= backoff
+
+def start_lab4_ingestion():
+    """Sync the vector store on a background thread, once per process.
+
+    Returns the sync's IngestProgress. Chat keeps working meanwhile against
+    whatever has been committed so far, and since the manifest is saved after
+    every batch, a restarted process picks up where the last one stopped.
+    A sync that ended with errors or failed files (e.g. during an API outage)
+    is started again by a later session, with a growing backoff.
+    """
+    state = get_lab4_index_state(vector_backend)
+    with state["lock"]:
+        if _sync_due(state):
+            if state["progress"] is not None:
+                state["failures"] += 1
+            progress = IngestProgress()
             
-            # Generate assistant response
-            with st.chat_message("assistant"):
-                with st.spinner("Searching documents and generating response..."):
-                    relevant_docs = search_vectordb(st.session_state.Lab4_vectorDB, prompt, top_k=3)
-                    
-                    # Generate RAG response
-                    response = generate_rag_response(prompt, relevant_docs)
-                    
-                    st.markdown(response)
+            def run():
+                try:
+                    # Index what is already stored before the sync adds or removes files
+                    load_bm25_index(get_lab4_store(vector_backend))
+                    create_lab4_vectordb(progress)
+                except Exception as e:
+                    progress.error(f"Error creating vector database: {e}")
+                    progress.finish()
             
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            state["progress"] = progress
+            threading.Thread(target=run, name="lab4-ingestion", daemon=True).start()
+        return state["progress"]
+
+def get_lab4_vectordb():
+    """Shared Lab 4 vector store, with its background sync started.
+
+    Sessions never wait for ingestion; they query the committed part of the
+    index while the sync runs.
+    """
+    start_lab4_ingestion()
+    return get_lab4_store(vector_backend)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+def show_ingestion_progress(progress):
+    """Progress bar for the background sync; refreshes itself until the sync ends"""
+    polling = progress.snapshot()["running"]
+    
+    @st.fragment(run_every=INGESTION_REFRESH_SECONDS if polling else None)
+    def render():
+        snapshot = progress.snapshot()
+        if snapshot["running"]:
+            eta = format_duration(snapshot["eta_seconds"]) if snapshot["eta_seconds"] is not None else "estimating..."
+            st.progress(
+                snapshot["fraction"],
+                text=(
+                    f"Indexing documents: {snapshot['files_done']}/{snapshot['total_files']} files, "
+                    f"{snapshot['chunks_done']} chunks, ETA {eta}"
+                )
+            )
+            st.caption(f"{snapshot['message']} You can already ask about the documents indexed so far.")
+        elif polling:
+            # The sync just finished: redraw the page once, without polling
+            st.rerun()
+        for error in snapshot["errors"]:
+            st.error(error)
+    
+    render()
+
+def main():
+    try:
+        collection = get_lab4_vectordb()
+    except Exception as e:
+        st.error(f"Error opening vector database: {e}")
+        return
+    
+    st.markdown("## 💬 Chat with your Documents")
+    st.markdown("Ask questions about the documents in your knowledge base!")
+    show_ingestion_progress(start_lab4_ingestion())
+    
+    cache_stats = get_embedding_cache().stats()
+    st.sidebar.caption(
+        f"Embedding cache: {cache_stats['entries']} vectors, "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+    )
+    retrieval_mode = st.sidebar.radio("Retrieval mode", RETRIEVAL_MODES)
+    retrieval_stats = get_retrieval_cache().stats()
+    st.sidebar.caption(f"Retrieval cache hit rate: {retrieval_stats['hit_rate']:.0%}")
+    
+    # Private uploads, searched together with the shared documents
+    registry = get_namespace_registry()
+    uploads = st.sidebar.file_uploader("Add your own PDFs", type="pdf", accept_multiple_files=True)
+    namespace = registry.get(st.session_state.namespace, create=bool(uploads))
+    if uploads:
+        with st.spinner("Indexing your documents..."):
+            add_uploads(namespace, uploads)
+    if namespace is not None and namespace.count():
+        registry_stats = registry.stats()
+        st.sidebar.caption(
+            f"Your documents: {len(namespace.files)} files, {namespace.count()} chunks "
+            f"({registry_stats['loaded']} upload sets in memory, "
+            f"{registry_stats['memory_bytes'] / 2**20:.0f} of {registry_stats['memory_budget'] / 2**20:.0f} MB)"
+        )
+    
+    # Display chat messages from history
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+    
+    # Chat input
+    if prompt := st.chat_input("Ask me anything about the documents"):
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
         
+        # Generate assistant response
+        with st.chat_message("assistant"):
+            with st.spinner("Searching documents..."):
+                search_start = time.perf_counter()
+                candidates = search_vectordb(
+                    collection, prompt, top_k=RAG_CANDIDATES, mode=retrieval_mode, namespace=namespace
+                )
+                relevant_docs = load_passages(
+                    collection, select_passages(collection, prompt, candidates, namespace=namespace), namespace
+                )
+                search_ms = (time.perf_counter() - search_start) * 1000
+            
+            # Stream the RAG response as it is generated
+            response = st.write_stream(generate_rag_response(prompt, relevant_docs))
+            st.caption(
+                f"{retrieval_mode} retrieval: {len(relevant_docs)} of {len(candidates)} passages "
+                f"selected in {search_ms:.1f} ms"
+            )
+        
+        st.session_state.messages.append({"role": "assistant", "content": response})
+    
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
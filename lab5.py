@@ -1,27 +1,52 @@
 import streamlit as st
 import requests
 import json
-from openai import OpenAI
+import os
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize OpenAI client
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+import telemetry
+from llm_gateway import get_openai_client
+from resources import HTTP_TIMEOUT, WEATHER_CACHE_TTL, get_http_session, get_weather_cache
 
-def get_current_weather(location, API_key=None):
-    if API_key is None:
-        API_key = st.secrets["OPENWEATHERMAP_API_KEY"]
-    
-    # Clean location name
-    if "," in location:
-        location = location.split(",")[0].strip()
-    
+# Shared OpenAI client
+client = get_openai_client(st.secrets["OPENAI_API_KEY"])
+
+# Point at a local stand-in (see fake_openai.py) with OPENWEATHERMAP_BASE_URL
+WEATHER_API_BASE = os.environ.get("OPENWEATHERMAP_BASE_URL", "https://api.openweathermap.org/data/2.5/")
+
+# Weather cache lifetime in seconds; override with WEATHER_CACHE_TTL in secrets
+weather_cache_ttl = int(st.secrets.get("WEATHER_CACHE_TTL", WEATHER_CACHE_TTL))
+
+class WeatherError(Exception):
+    """A weather lookup failed; the message is safe to show users and the model"""
+
+def fetch_current_weather(location, API_key):
+    """Call OpenWeatherMap over the shared session; raises WeatherError on failure.
+
+    requests errors carry the request URL, API key included, so they are
+    replaced by messages built only from the status code.
+    """
     # Construct API URL
-    urlbase = "https://api.openweathermap.org/data/2.5/"
-    urlweather = f"weather?q={location}&appid={API_key}"
+    urlbase = WEATHER_API_BASE
+    urlweather = "weather"
     url = urlbase + urlweather
     
     try:
-        response = requests.get(url)
-        response.raise_for_status() 
+        with telemetry.span("weather.fetch") as fields:
+            response = get_http_session().get(
+                url,
+                params={"q": location, "appid": API_key},
+                timeout=HTTP_TIMEOUT
+            )
+            fields["status"] = response.status_code
+    except requests.exceptions.RequestException:
+        raise WeatherError("Weather service unavailable") from None
+    if response.status_code == 404:
+        raise WeatherError(f"City not found: {location}")
+    if not response.ok:
+        raise WeatherError(f"Weather service unavailable (HTTP {response.status_code})")
+    
+    try:
         data = response.json()
         
         # Extract temperatures & Convert Kelvin to Celsius
@@ -35,27 +60,50 @@ def get_current_weather(location, API_key=None):
         description = data['weather'][0]['description']
         main_weather = data['weather'][0]['main']
         wind_speed = data.get('wind', {}).get('speed', 0)  # m/s
-        
-        return {
-            "location": data['name'],
-            "temperature": round(temp, 2),
-            "feels_like": round(feels_like, 2),
-            "temp_min": round(temp_min, 2),
-            "temp_max": round(temp_max, 2),
-            "humidity": round(humidity, 2),
-            "description": description,
-            "main_weather": main_weather,
-            "wind_speed": round(wind_speed, 2)
-        }
+    except (ValueError, KeyError, IndexError, TypeError):
+        raise WeatherError("Unexpected response from the weather service") from None
+    
+    return {
+        "location": data['name'],
+        "temperature": round(temp, 2),
+        "feels_like": round(feels_like, 2),
+        "temp_min": round(temp_min, 2),
+        "temp_max": round(temp_max, 2),
+        "humidity": round(humidity, 2),
+        "description": description,
+        "main_weather": main_weather,
+        "wind_speed": round(wind_speed, 2)
+    }
+
+def lookup_weather(location, API_key=None):
+    """Current weather for a city, served from the shared TTL cache when fresh.
+
+    Raises on failure and never touches the Streamlit UI, so it is safe to
+    call from worker threads.
+    """
+    if API_key is None:
+        API_key = st.secrets["OPENWEATHERMAP_API_KEY"]
+    
+    # Clean location name
+    if "," in location:
+        location = location.split(",")[0].strip()
+    
+    # Concurrent lookups for the same city share one in-flight request
+    return get_weather_cache(weather_cache_ttl).get_or_compute(
+        location.lower(),
+        lambda: fetch_current_weather(location, API_key)
+    )
+
+def get_current_weather(location, API_key=None):
+    """Current weather for a city, reporting failures in the UI"""
+    try:
+        return lookup_weather(location, API_key)
     
-    except requests.exceptions.RequestException as e:
+    except WeatherError as e:
         st.error(f"Error fetching weather data: {e}")
         return None
-    except KeyError as e:
-        st.error(f"Error parsing weather data: Missing key {e}")
-        return None
 
-def get_weather_for_openai(location):
+def get_weather_for_openai(location, API_key=None):
     """
     Wrapper function for OpenAI function calling.
     Returns weather data as a JSON string.
@@ -63,31 +111,69 @@ def get_weather_for_openai(location):
     if not location:
         location = "Syracuse, NY"  
     
-    weather_data = get_current_weather(location)
-    if weather_data:
-        return json.dumps(weather_data)
-    else:
-        return json.dumps({"error": "Could not retrieve weather data"})
+    try:
+        return json.dumps(lookup_weather(location, API_key))
+    except WeatherError as e:
+        return json.dumps({"location": location, "error": f"Could not retrieve weather data: {e}"})
 
-def get_clothing_suggestions(location):
-    # Define the weather function for OpenAI
-    weather_function = {
-        "type": "function",
-        "function": {
-            "name": "get_weather_for_openai",
-            "description": "Get current weather information for a specific location",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "City name (e.g., 'Syracuse, NY' or 'London, England')"
-                    }
-                },
-                "required": ["location"]
-            }
+# Define the weather function for OpenAI
+weather_function = {
+    "type": "function",
+    "function": {
+        "name": "get_weather_for_openai",
+        "description": "Get current weather information for a specific location",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'Syracuse, NY' or 'London, England')"
+                }
+            },
+            "required": ["location"]
         }
     }
+}
+
+# Tool name -> callable(arguments, API_key) returning the tool result string
+TOOL_FUNCTIONS = {
+    "get_weather_for_openai": lambda args, API_key: get_weather_for_openai(args.get("location"), API_key),
+}
+
+# Tool calls from one model turn run concurrently on at most this many threads
+MAX_TOOL_WORKERS = 8
+# Stop offering tools after this many rounds so a confused model can't loop forever
+MAX_TOOL_ROUNDS = 4
+
+def run_tool_call(tool_call, API_key):
+    """Execute one tool call and return its result as a string"""
+    function = TOOL_FUNCTIONS.get(tool_call.function.name)
+    if function is None:
+        return json.dumps({"error": f"Unknown tool {tool_call.function.name}"})
+    try:
+        args = json.loads(tool_call.function.arguments or "{}")
+    except ValueError:
+        return json.dumps({"error": "Tool arguments were not valid JSON"})
+    return function(args, API_key)
+
+def run_tool_calls(tool_calls, API_key):
+    """Execute all tool calls of a turn concurrently, returning tool messages in order"""
+    with ThreadPoolExecutor(max_workers=min(len(tool_calls), MAX_TOOL_WORKERS)) as pool:
+        results = list(pool.map(lambda tool_call: run_tool_call(tool_call, API_key), tool_calls))
+    return [
+        {"role": "tool", "content": result, "tool_call_id": tool_call.id}
+        for tool_call, result in zip(tool_calls, results)
+    ]
+
+def get_clothing_suggestions(location):
+    """Clothing and picnic advice for one location, or a comparison for a list of them"""
+    if isinstance(location, str):
+        question = f"What should I wear today in {location}? Also, is it a good day for a picnic?"
+    else:
+        question = (
+            f"Compare what to wear today in each of these places: {'; '.join(location)}. "
+            "Also, where is it a good day for a picnic?"
+        )
     
     messages = [
         {
@@ -95,53 +181,61 @@ def get_clothing_suggestions(location):
             "content": """You are a helpful weather and clothing advisor. When asked about clothing suggestions 
             for a location, first get the current weather information, then provide detailed clothing recommendations 
             and advice about whether it's a good day for a picnic. Be specific about clothing items and explain 
-            your reasoning based on the weather conditions."""
+            your reasoning based on the weather conditions. When several locations are mentioned, request the 
+            weather for all of them at once."""
         },
         {
             "role": "user",
-            "content": f"What should I wear today in {location}? Also, is it a good day for a picnic?"
+            "content": question
         }
     ]
     
     try:
-        # First OpenAI API call with function calling
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            tools=[weather_function],
-            tool_choice="auto"
-        )
+        # Resolve the key here; tool calls run on worker threads
+        API_key = st.secrets["OPENWEATHERMAP_API_KEY"]
         
-        if response.choices[0].message.tool_calls:
-            tool_call = response.choices[0].message.tool_calls[0]
-            function_name = tool_call.function.name
-            function_args = json.loads(tool_call.function.arguments)
+        # Keep answering tool calls until the model replies with text
+        for _ in range(MAX_TOOL_ROUNDS):
+            response = client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                tools=[weather_function],
+                tool_choice="auto"
+            )
+            message = response.choices[0].message
+            if not message.tool_calls:
+                return message.content
             
-            if function_name == "get_weather_for_openai":
-                weather_result = get_weather_for_openai(function_args.get("location", location))
-                
-                messages.append(response.choices[0].message)
-                messages.append({
-                    "role": "tool",
-                    "content": weather_result,
-                    "tool_call_id": tool_call.id
-                })
-                
-                # Second OpenAI API call with weather information
-                final_response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages
-                )
-                
-                return final_response.choices[0].message.content
+            messages.append(message)
+            messages.extend(run_tool_calls(message.tool_calls, API_key))
         
-        else:
-            return response.choices[0].message.content
+        # Out of tool rounds: answer with what has been gathered
+        final_response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages
+        )
+        return final_response.choices[0].message.content
             
     except Exception as e:
         st.error(f"Error getting clothing suggestions: {e}")
         return "Sorry, I couldn't process your request. Please try again."
 
+def show_weather_details(weather_data):
+    """Render one location's raw weather data as metrics"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.metric("🌡️ Temperature", f"{weather_data['temperature']}°C")
+        st.metric("🤒 Feels Like", f"{weather_data['feels_like']}°C")
+        st.metric("💧 Humidity", f"{weather_data['humidity']}%")
+    
+    with col2:
+        st.metric("🌡️ Min Temp", f"{weather_data['temp_min']}°C")
+        st.metric("🌡️ Max Temp", f"{weather_data['temp_max']}°C")
+        st.metric("💨 Wind Speed", f"{weather_data['wind_speed']} m/s")
+    
+    st.info(f"☁️ **Weather**: {weather_data['description'].title()}")
+
 def main():
     st.title("🌤️ Nikita's What to wear Bot")
     st.markdown("Get personalized clothing recommendations based on current weather!")
@@ -161,37 +255,40 @@ def main():
     
     st.header("Get Your Daily Outfit Suggestions")
     
+    compare_mode = st.toggle("Compare several cities")
+    
     # Location input
-    location = st.text_input(
-        "Enter a city name:", 
-        value="Syracuse, NY",
-        placeholder="e.g., Syracuse NY, London England, Paris France"
-    )
+    if compare_mode:
+        locations_text = st.text_area(
+            "Enter one city per line:",
+            value="London, England\nParis, France\nTokyo, Japan"
+        )
+        locations = [line.strip() for line in locations_text.splitlines() if line.strip()]
+    else:
+        location = st.text_input(
+            "Enter a city name:", 
+            value="Syracuse, NY",
+            placeholder="e.g., Syracuse NY, London England, Paris France"
+        )
+        locations = [location] if location else []
     
     if st.button("Get Weather & Clothing Suggestions", type="primary"):
-        if location:
+        if locations:
             with st.spinner("Analyzing weather and preparing suggestions..."):
-                suggestions = get_clothing_suggestions(location)
+                # Weather for every city is fetched in parallel by the tool loop
+                suggestions = get_clothing_suggestions(locations if compare_mode else locations[0])
                 
                 st.markdown("### 👔 Your Personalized Recommendations:")
                 st.markdown(suggestions)
                 
                 with st.expander("📊 View Raw Weather Data"):
-                    weather_data = get_current_weather(location)
-                    if weather_data:
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.metric("🌡️ Temperature", f"{weather_data['temperature']}°C")
-                            st.metric("🤒 Feels Like", f"{weather_data['feels_like']}°C")
-                            st.metric("💧 Humidity", f"{weather_data['humidity']}%")
-                        
-                        with col2:
-                            st.metric("🌡️ Min Temp", f"{weather_data['temp_min']}°C")
-                            st.metric("🌡️ Max Temp", f"{weather_data['temp_max']}°C")
-                            st.metric("💨 Wind Speed", f"{weather_data['wind_speed']} m/s")
-                        
-                        st.info(f"☁️ **Weather**: {weather_data['description'].title()}")
+                    # Served from the weather cache filled by the tool calls
+                    tabs = st.tabs(locations)
+                    for tab, city in zip(tabs, locations):
+                        with tab:
+                            weather_data = get_current_weather(city)
+                            if weather_data:
+                                show_weather_details(weather_data)
         else:
             st.warning("Please enter a city name!")
     
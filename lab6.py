@@ -1,6 +1,17 @@
 import streamlit as st
-from openai import OpenAI
+import asyncio
+import csv
+import io
 import json
+import time
+
+import telemetry
+from claim_cache import CLAIM_SIMILARITY_THRESHOLD, normalize_claim
+from embeddings import embed_texts
+from json_stream import JSONObjectStream, parse_json_object
+from rate_limiter import AsyncRateLimiter, call_with_retries, estimate_tokens
+from llm_gateway import MAX_CONCURRENT_REQUESTS, get_openai_client, make_async_client
+from resources import get_claim_cache
 
 # Show title and description
 st.title("📄 Nikita's AI Fact-Checker + Citation Builder Lab 6")
@@ -10,65 +21,347 @@ openai_api_key = st.secrets["OPENAI_API_KEY"]
 openAI_model = st.sidebar.selectbox("Which Model?", ("mini", "regular"))
 model = "gpt-4o" if openAI_model == "regular" else "gpt-4o-mini"
 
-if 'client' not in st.session_state:
-    st.session_state.client = OpenAI(api_key=openai_api_key)
+client = get_openai_client(openai_api_key)
+claim_cache = get_claim_cache()
+
+similarity_threshold = st.sidebar.slider(
+    "Reuse verdicts for claims at least this similar",
+    min_value=0.80, max_value=1.0, value=CLAIM_SIMILARITY_THRESHOLD, step=0.01
+)
+# Filled in at the end of the script, so the stats include this run's checks
+cache_caption = st.sidebar.empty()
 
 if "claim_history" not in st.session_state:
     st.session_state.claim_history = []
 
-# Fact-checking function
-def fact_check_claim(claim):
-    client = st.session_state.client
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": """You are a fact-checker. Verify claims using available information and provide results in this exact JSON format:
+if "batch_results" not in st.session_state:
+    st.session_state.batch_results = []
+
+FACT_CHECK_SYSTEM_PROMPT = """You are a fact-checker. Verify claims using available information and provide results in this exact JSON format:
 {
-  "claim": "the original claim",
   "verdict": "True/False/Partially True/Unclear",
   "explanation": "brief explanation with evidence",
-  "sources": ["source1", "source2"]
+  "sources": ["source1", "source2"],
+  "claim": "the original claim"
 }"""
-            },
-            {
-                "role": "user",
-                "content": f"Fact-check this claim: {claim}"
-            }
-        ],
-        response_format={"type": "json_object"}
+
+# Fields in the order the prompt asks for them, verdict first so it streams in first
+RESULT_FIELDS = ("verdict", "explanation", "sources", "claim")
+
+# Budgeted completion size per claim, used for tokens-per-minute accounting
+FACT_CHECK_COMPLETION_TOKENS = 400
+
+def fact_check_messages(claim):
+    """Chat messages for fact-checking one claim"""
+    return [
+        {
+            "role": "system",
+            "content": FACT_CHECK_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Fact-check this claim: {claim}"
+        }
+    ]
+
+def embed_claims(claims):
+    """Claim embeddings for near-duplicate matching; None entries if embedding fails"""
+    try:
+        return embed_texts(client, claims)
+    except Exception:
+        return [None] * len(claims)
+
+def lookup_similar_verdict(embedding):
+    """Cached (result, note) for a near-duplicate claim, or (None, None) on a miss"""
+    if embedding is not None:
+        match = claim_cache.find_similar(model, embedding, similarity_threshold)
+        if match is not None:
+            result, matched_claim, similarity = match
+            return result, f'similar to "{matched_claim}" ({similarity:.2f})'
+    return None, None
+
+def check_claim(claim, on_field=None):
+    """Fact-check a claim through the verdict cache.
+
+    Returns (result, cache_note); cache_note is None when the model was called.
+    on_field(key, value) is called for each field of a fresh verdict as it
+    streams in. Results the model didn't finish (with an "error") aren't cached.
+    """
+    result = claim_cache.get_exact(model, claim)
+    if result is not None:
+        return result, "exact"
+    embedding = embed_claims([claim])[0]
+    result, note = lookup_similar_verdict(embedding)
+    if result is not None:
+        return result, note
+    result = fact_check_claim_uncached(claim, on_field)
+    if "error" not in result:
+        claim_cache.put(model, claim, result, embedding)
+    return result, None
+
+# Fact-checking function
+def fact_check_claim(claim):
+    """Fact-check a claim, reusing cached verdicts for the same or near-identical claims"""
+    return check_claim(claim)[0]
+
+def fact_check_claim_uncached(claim, on_field=None):
+    """Stream a verdict from the model, parsing the JSON as it arrives.
+
+    Malformed or truncated output doesn't raise: the fields that did parse
+    are returned with an "error" entry describing the problem.
+    """
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=fact_check_messages(claim),
+        response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True}
     )
-    
-    result_text = response.choices[0].message.content
-    result = json.loads(result_text)
-    
+
+    parser = JSONObjectStream()
+    stream_error = None
+    try:
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for key, value in parser.feed(chunk.choices[0].delta.content):
+                if key == "verdict":
+                    telemetry.record("lab6.time_to_verdict", (time.perf_counter() - start) * 1000, model=model)
+                if on_field is not None:
+                    on_field(key, value)
+    except Exception as e:
+        stream_error = f"The response stream failed: {e}"
+
+    result, error = parser.result()
+    if stream_error or error:
+        result["error"] = stream_error or error
     return result
 
-# User input
-user_claim = st.text_input("Enter a factual claim:", placeholder="e.g., Is dark chocolate healthy?")
+def parse_claims_file(uploaded_file):
+    """Read claims from a CSV (a "claim" column, or the first column) or JSONL upload"""
+    text = uploaded_file.read().decode("utf-8", errors="ignore")
+    claims = []
+    if uploaded_file.name.lower().endswith(".jsonl"):
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            claims.append(item.get("claim", "") if isinstance(item, dict) else str(item))
+    else:
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows:
+            header = [cell.strip().lower() for cell in rows[0]]
+            column = header.index("claim") if "claim" in header else 0
+            body = rows[1:] if "claim" in header else rows
+            claims = [row[column] for row in body if len(row) > column]
+    return [claim.strip() for claim in claims if claim and claim.strip()]
+
+def result_row(claim, result, cache_note=None, error=""):
+    """Table row for one checked claim"""
+    result = result or {}
+    error = error or result.get("error", "")
+    return {
+        "claim": claim,
+        "verdict": result.get("verdict", ""),
+        "explanation": result.get("explanation", ""),
+        "sources": "; ".join(result.get("sources", []) or []),
+        "cached": cache_note or "",
+        "error": error
+    }
+
+async def fact_check_batch(claims, on_result, requests_per_minute, tokens_per_minute, max_concurrency):
+    """Fact-check claims concurrently within the API quota.
+
+    Claims repeated within the upload (same normalized text) are checked
+    once and the result is given to every copy. Claims already in the
+    verdict cache (exactly or as near-duplicates) are answered first without
+    a model call. on_result(index, row) is called on the event loop thread as
+    each claim finishes, in completion order.
+    """
+    # First index of each distinct claim -> every index with that claim
+    copies = {}
+    for index, claim in enumerate(claims):
+        copies.setdefault(normalize_claim(claim), []).append(index)
+    copies = {indices[0]: indices for indices in copies.values()}
+
+    def finish(index, result, cache_note=None, error=""):
+        for copy in copies[index]:
+            on_result(copy, result_row(claims[copy], result, cache_note, error))
+
+    pending = []
+    exact_misses = []
+    for index in copies:
+        result = claim_cache.get_exact(model, claims[index])
+        if result is not None:
+            finish(index, result, "exact")
+        else:
+            exact_misses.append(index)
+    # One batched embeddings request covers every claim that still needs a lookup
+    embeddings = embed_claims([claims[index] for index in exact_misses])
+    for index, embedding in zip(exact_misses, embeddings):
+        result, note = lookup_similar_verdict(embedding)
+        if result is not None:
+            finish(index, result, note)
+        else:
+            pending.append((index, embedding))
+    if not pending:
+        return
+
+    limiter = AsyncRateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # Retries are handled here, with backoff that respects the rate limiter
+    async with make_async_client(openai_api_key, max_retries=0) as async_client:
+
+        async def check(index, claim):
+            messages = fact_check_messages(claim)
+            prompt_text = FACT_CHECK_SYSTEM_PROMPT + messages[1]["content"]
+
+            async def make_call():
+                await limiter.acquire(estimate_tokens(prompt_text, FACT_CHECK_COMPLETION_TOKENS))
+                return await async_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    max_tokens=FACT_CHECK_COMPLETION_TOKENS
+                )
+
+            async with semaphore:
+                try:
+                    response = await call_with_retries(make_call)
+                except Exception as e:
+                    return index, None, e
+                result, error = parse_json_object(response.choices[0].message.content)
+                if error:
+                    result["error"] = error
+                return index, result, None
+
+        tasks = [asyncio.create_task(check(index, claims[index])) for index, _ in pending]
+        embeddings_by_index = dict(pending)
+        for finished in asyncio.as_completed(tasks):
+            index, result, error = await finished
+            if error is None:
+                if "error" not in result:
+                    claim_cache.put(model, claims[index], result, embeddings_by_index[index])
+                finish(index, result)
+            else:
+                finish(index, None, error=str(error))
+
+def results_to_csv(rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=["claim", "verdict", "explanation", "sources", "cached", "error"])
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+def results_to_jsonl(rows):
+    return "\n".join(json.dumps(row) for row in rows) + "\n"
+
+def show_field(slots, key, value):
+    """Render one field of a fact-check result into its placeholder"""
+    if key not in slots:
+        return
+    if key == "verdict":
+        slots[key].subheader(f"Verdict: {value}")
+    elif key == "explanation":
+        slots[key].markdown(str(value))
+    elif key == "sources":
+        sources = value if isinstance(value, list) else [value]
+        if sources:
+            slots[key].markdown("**Sources:**\n" + "\n".join(f"- {source}" for source in sources))
+        else:
+            slots[key].markdown("*No sources given*")
+    elif key == "claim":
+        slots[key].caption(f"Claim: {value}")
+
+mode = st.radio("Mode", ("Single claim", "Batch"), horizontal=True)
+
+if mode == "Single claim":
+    # User input
+    user_claim = st.text_input("Enter a factual claim:", placeholder="e.g., Is dark chocolate healthy?")
+
+    # Check fact button
+    if st.button("Check Fact"):
+        if user_claim:
+            # One placeholder per field, filled in as the streamed JSON completes each one
+            slots = {key: st.empty() for key in RESULT_FIELDS}
+            with st.spinner("Verifying claim..."):
+                result, cache_note = check_claim(user_claim, lambda key, value: show_field(slots, key, value))
 
-# Check fact button
-if st.button("Check Fact"):
-    if user_claim:
-        with st.spinner("Verifying claim..."):
-            result = fact_check_claim(user_claim)
-            
             # Display result
-            st.json(result)
-            
+            for key in RESULT_FIELDS:
+                if key in result:
+                    show_field(slots, key, result[key])
+            if cache_note:
+                st.caption(f"♻️ Cached verdict ({cache_note})")
+            if "error" in result:
+                st.warning(f"Incomplete verdict: {result['error']}")
+            with st.expander("Raw JSON"):
+                st.json(result)
+
             # Add to history
             st.session_state.claim_history.append({
                 "claim": user_claim,
                 "result": result
             })
-    else:
-        st.warning("Please enter a claim to check.")
-
-# Show history
-if st.session_state.claim_history:
-    st.subheader("Recent Checks")
-    for i, item in enumerate(reversed(st.session_state.claim_history[-5:])):
-        with st.expander(f"{i+1}. {item['claim'][:50]}..."):
-            st.json(item['result'])
\ No newline at end of file
+        else:
+            st.warning("Please enter a claim to check.")
+
+    # Show history
+    if st.session_state.claim_history:
+        st.subheader("Recent Checks")
+        for i, item in enumerate(reversed(st.session_state.claim_history[-5:])):
+            with st.expander(f"{i+1}. {item['claim'][:50]}..."):
+                st.json(item['result'])
+
+else:
+    st.sidebar.header("Batch limits")
+    requests_per_minute = st.sidebar.number_input("Requests per minute", min_value=1, value=500)
+    tokens_per_minute = st.sidebar.number_input("Tokens per minute", min_value=1000, value=200000, step=1000)
+    max_concurrency = st.sidebar.number_input("Max concurrent requests", min_value=1, max_value=MAX_CONCURRENT_REQUESTS, value=16)
+
+    claims_file = st.file_uploader("Upload claims (.csv or .jsonl)", type=("csv", "jsonl"))
+
+    if st.button("Check All Claims") and claims_file:
+        try:
+            claims = parse_claims_file(claims_file)
+        except ValueError as e:
+            st.error(f"Could not read claims file: {e}")
+            claims = []
+
+        if claims:
+            rows = [{**result_row(claim, None), "verdict": "⏳"} for claim in claims]
+            progress = st.progress(0.0, text=f"0/{len(claims)} claims checked")
+            table = st.empty()
+            table.dataframe(rows, use_container_width=True)
+            done = [0]
+
+            def on_result(index, row):
+                # Runs on this script thread, so updating the UI here is safe
+                rows[index] = row
+                done[0] += 1
+                progress.progress(done[0] / len(claims), text=f"{done[0]}/{len(claims)} claims checked")
+                table.dataframe(rows, use_container_width=True)
+
+            asyncio.run(fact_check_batch(
+                claims, on_result, requests_per_minute, tokens_per_minute, max_concurrency
+            ))
+            st.session_state.batch_results = rows
+            # The downloads below rerun the script, which redraws the table from session state
+            table.empty()
+            progress.empty()
+        else:
+            st.warning("No claims found in the file.")
+
+    if st.session_state.batch_results:
+        rows = st.session_state.batch_results
+        st.dataframe(rows, use_container_width=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("Download CSV", results_to_csv(rows), "fact_checks.csv", "text/csv")
+        col2.download_button("Download JSONL", results_to_jsonl(rows), "fact_checks.jsonl", "application/json")
+
+cache_stats = claim_cache.stats()
+cache_caption.caption(
+    f"Verdict cache: {cache_stats['entries']} claims, hit rate {cache_stats['hit_rate']:.0%} "
+    f"({cache_stats['exact_hits']} exact, {cache_stats['semantic_hits']} similar, {cache_stats['misses']} misses)"
+)
@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+from openai import AsyncOpenAI, AuthenticationError, OpenAI, PermissionDeniedError
+
+import telemetry
+from ttl_cache import TTLCache
+
+# One pooled transport per process; every page's OpenAI traffic goes through it
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60.0
+REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+# The SDK retries 408/409/429/5xx and connection errors with jittered exponential backoff
+MAX_RETRIES = 3
+# Requests in flight at once across all sessions; extra requests queue for a slot
+MAX_CONCURRENT_REQUESTS = 32
+QUEUE_TIMEOUT = 30.0
+# How long a key validation result is trusted
+KEY_VALIDATION_TTL = 10 * 60
+# Clients kept for distinct API keys (Lab 1 takes keys from users); least recently used go first
+MAX_CLIENTS = 16
+# Async callers poll for a free slot, backing off up to this long between tries
+ASYNC_SLOT_POLL_MAX = 0.05
+
+
+# Usage counts sit at the end of both JSON and streamed (include_usage) responses
+_TAIL_BYTES = 4096
+_PROMPT_TOKENS_RE = re.compile(rb'"prompt_tokens":\s*(\d+)')
+_COMPLETION_TOKENS_RE = re.compile(rb'"completion_tokens":\s*(\d+)')
+_MODEL_RE = re.compile(rb'"model":\s*"([^"]+)"')
+
+
+def _usage_from_tail(tail):
+    """Token counts found in the last bytes of a response body"""
+    usage = {}
+    for name, pattern in (("prompt_tokens", _PROMPT_TOKENS_RE), ("completion_tokens", _COMPLETION_TOKENS_RE)):
+        matches = pattern.findall(tail)
+        if matches:
+            usage[name] = int(matches[-1])
+    return usage
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees its concurrency slot once closed.
+
+    It also keeps the last few KB of the body so on_close can pick the token
+    usage out of it without parsing the whole response.
+    """
+
+    def __init__(self, stream, release, on_close=None):
+        self._stream = stream
+        self._release = release
+        self._on_close = on_close
+        self._released = False
+        self._tail = b""
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-_TAIL_BYTES:]
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+                if self._on_close is not None:
+                    self._on_close(self._tail)
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """_ReleasingStream for async responses"""
+
+    def __init__(self, stream, release, on_close=None):
+        self._stream = stream
+        self._release = release
+        self._on_close = on_close
+        self._released = False
+        self._tail = b""
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-_TAIL_BYTES:]
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+                if self._on_close is not None:
+                    self._on_close(self._tail)
+
+
+def _request_telemetry(request):
+    """Telemetry stage and fields for an API request"""
+    # "/v1/chat/completions" -> "openai.chat.completions"
+    stage = "openai." + request.url.path.split("/v1/", 1)[-1].strip("/").replace("/", ".")
+    fields = {}
+    try:
+        model = _MODEL_RE.search(request.content)
+        if model:
+            fields["model"] = model.group(1).decode()
+    except Exception:
+        pass
+    return stage, fields
+
+
+def _response_recorder(stage, fields, response, start, queue_ms):
+    """on_close callback that records a finished response"""
+    # Time to response headers; for streamed completions this is roughly time to first token
+    ttfb_ms = (time.perf_counter() - start) * 1000
+
+    def on_close(tail):
+        if response.status_code >= 400:
+            fields["error"] = f"HTTP {response.status_code}"
+        telemetry.record(
+            stage, (time.perf_counter() - start) * 1000,
+            status=response.status_code, queue_ms=round(queue_ms, 3), ttfb_ms=round(ttfb_ms, 3),
+            **fields, **_usage_from_tail(tail)
+        )
+
+    return on_close
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    """Transport that caps in-flight requests with a process-wide semaphore.
+
+    A slot is held until the response body is closed, so streamed completions
+    count against the limit for as long as they are being read.
+    """
+
+    def __init__(self, transport, semaphore, queue_timeout):
+        self._transport = transport
+        self._semaphore = semaphore
+        self._queue_timeout = queue_timeout
+
+    def handle_request(self, request):
+        stage, fields = _request_telemetry(request)
+        start = time.perf_counter()
+        if not self._semaphore.acquire(timeout=self._queue_timeout):
+            telemetry.record(stage, (time.perf_counter() - start) * 1000, error="QueueTimeout", **fields)
+            raise httpx.PoolTimeout("Too many concurrent LLM requests in this process", request=request)
+        queue_ms = (time.perf_counter() - start) * 1000
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException as e:
+            self._semaphore.release()
+            telemetry.record(stage, (time.perf_counter() - start) * 1000, error=type(e).__name__, **fields)
+            raise
+        on_close = _response_recorder(stage, fields, response, start, queue_ms)
+        response.stream = _ReleasingStream(response.stream, self._semaphore.release, on_close)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class _LimitedAsyncTransport(httpx.AsyncBaseTransport):
+    """_LimitedTransport for async clients, taking slots from the same semaphore.
+
+    The semaphore is a threading one shared with sync callers, so waiting
+    polls it with a short backoff rather than blocking the event loop.
+    """
+
+    def __init__(self, transport, semaphore, queue_timeout):
+        self._transport = transport
+        self._semaphore = semaphore
+        self._queue_timeout = queue_timeout
+
+    async def _acquire(self):
+        deadline = time.monotonic() + self._queue_timeout
+        delay = 0.001
+        while not self._semaphore.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, ASYNC_SLOT_POLL_MAX)
+        return True
+
+    async def handle_async_request(self, request):
+        stage, fields = _request_telemetry(request)
+        start = time.perf_counter()
+        if not await self._acquire():
+            telemetry.record(stage, (time.perf_counter() - start) * 1000, error="QueueTimeout", **fields)
+            raise httpx.PoolTimeout("Too many concurrent LLM requests in this process", request=request)
+        queue_ms = (time.perf_counter() - start) * 1000
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            self._semaphore.release()
+            telemetry.record(stage, (time.perf_counter() - start) * 1000, error=type(e).__name__, **fields)
+            raise
+        on_close = _response_recorder(stage, fields, response, start, queue_ms)
+        response.stream = _AsyncReleasingStream(response.stream, self._semaphore.release, on_close)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+_lock = threading.Lock()
+_http_client = None
+_clients = OrderedDict()  # api key -> OpenAI, least recently used first
+_key_validations = TTLCache(maxsize=64, ttl=KEY_VALIDATION_TTL, name="key_validation")
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+def get_api_key():
+    """OpenAI API key from the environment, falling back to Streamlit secrets"""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if api_key:
+        return api_key
+    import streamlit as st
+    return st.secrets["OPENAI_API_KEY"]
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client():
+    """The process-wide pooled, keep-alive HTTP client used for all OpenAI calls"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            transport = _LimitedTransport(
+                httpx.HTTPTransport(limits=_pool_limits(), retries=0), _request_slots, QUEUE_TIMEOUT
+            )
+            _http_client = httpx.Client(transport=transport, timeout=REQUEST_TIMEOUT)
+        return _http_client
+
+
+def get_openai_client(api_key=None):
+    """Shared OpenAI client for an API key, on the process-wide transport.
+
+    The SDK honours OPENAI_BASE_URL, which points every client at another
+    endpoint (e.g. fake_openai.py for offline benchmarks).
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    http_client = get_http_client()
+    with _lock:
+        if api_key in _clients:
+            _clients.move_to_end(api_key)
+        else:
+            _clients[api_key] = OpenAI(
+                api_key=api_key,
+                http_client=http_client,
+                timeout=REQUEST_TIMEOUT,
+                max_retries=MAX_RETRIES,
+            )
+            # Dropped clients aren't closed: they share the process-wide HTTP client
+            while len(_clients) > MAX_CLIENTS:
+                _clients.popitem(last=False)
+        return _clients[api_key]
+
+
+def make_async_client(api_key=None, max_retries=MAX_RETRIES):
+    """New AsyncOpenAI client with the gateway's timeouts and concurrency limit.
+
+    Async connection pools are bound to the event loop they run on, so callers
+    create one client per loop (use it as an async context manager). Its
+    requests take slots from the same process-wide limit as every sync client
+    and are recorded to telemetry the same way.
+    """
+    if api_key is None:
+        api_key = get_api_key()
+    transport = _LimitedAsyncTransport(
+        httpx.AsyncHTTPTransport(limits=_pool_limits(), retries=0), _request_slots, QUEUE_TIMEOUT
+    )
+    http_client = httpx.AsyncClient(transport=transport, timeout=REQUEST_TIMEOUT)
+    return AsyncOpenAI(api_key=api_key, http_client=http_client, timeout=REQUEST_TIMEOUT, max_retries=max_retries)
+
+
+def validate_api_key(api_key):
+    """Check a key with models.list(), remembering the outcome for a while.
+
+    Returns None if the key works, otherwise a message to show. Reruns (every
+    keystroke in a text box) reuse the cached answer instead of calling the API.
+    Only a working key or a rejected one is cached; timeouts, rate limits and
+    server errors are reported without caching, so the next rerun tries again.
+    """
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def check():
+        # A throwaway client, so keys that turn out to be invalid don't take a slot in _clients
+        client = OpenAI(
+            api_key=api_key, http_client=get_http_client(), timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES
+        )
+        try:
+            client.models.list()
+            return None
+        except (AuthenticationError, PermissionDeniedError) as e:
+            return f"Invalid API key. {e}"
+
+    try:
+        return _key_validations.get_or_compute(key_hash, check)
+    except Exception as e:
+        return f"Could not check the API key right now, please try again. {e}"
@@ -0,0 +1,58 @@
+import streamlit as st
+import time
+
+from telemetry import TELEMETRY_PATH, load_events, summarize_events
+
+WINDOWS = {
+    "Last 15 minutes": 15 * 60,
+    "Last hour": 60 * 60,
+    "Last 24 hours": 24 * 60 * 60,
+    "Everything": None,
+}
+
+st.title("📊 Metrics")
+st.write("Per-stage latency, token usage and cache hit rates recorded by every lab in this process.")
+
+window = st.sidebar.selectbox("Time window", list(WINDOWS), index=1)
+if st.sidebar.button("Refresh"):
+    st.rerun()
+
+seconds = WINDOWS[window]
+events = load_events(since=time.time() - seconds if seconds else None)
+
+if not events:
+    st.info(f"No telemetry recorded yet. Events are written to {TELEMETRY_PATH} as the labs are used.")
+    st.stop()
+
+rows = summarize_events(events)
+latency_rows = [row for row in rows if row["p50_ms"] is not None]
+cache_rows = [row for row in rows if row["cache_hit_rate"] is not None]
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Events", len(events))
+col2.metric("Prompt tokens", sum(row["prompt_tokens"] for row in rows))
+col3.metric("Completion tokens", sum(row["completion_tokens"] for row in rows))
+
+st.subheader("Latency by stage")
+st.dataframe(
+    [
+        {key: row[key] for key in ("stage", "count", "errors", "p50_ms", "p95_ms", "p99_ms", "prompt_tokens", "completion_tokens")}
+        for row in latency_rows
+    ],
+    use_container_width=True,
+    hide_index=True
+)
+
+if cache_rows:
+    st.subheader("Cache hit rates")
+    st.dataframe(
+        [
+            {"cache": row["stage"].removeprefix("cache."), "events": row["count"], "hit_rate": round(row["cache_hit_rate"], 3)}
+            for row in cache_rows
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+with st.expander("Recent events"):
+    st.dataframe(events[-200:][::-1], use_container_width=True)
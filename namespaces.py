@@ -0,0 +1,159 @@
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from bm25_index import BM25Index
+from corpus_store import CorpusStore
+from vector_store import NumpyVectorStore
+
+NAMESPACE_ROOT = "./.cache/namespaces"
+# Loaded namespaces beyond this estimated size are spilled (dropped from memory,
+# kept on disk), least recently used first
+NAMESPACE_MEMORY_BUDGET = 256 * 1024 * 1024
+# Namespaces nobody has touched for this long are deleted from disk too
+NAMESPACE_IDLE_TTL = 6 * 60 * 60
+# How often the disk is checked for idle namespaces
+SWEEP_INTERVAL = 5 * 60
+# Rough per-chunk overhead of metadata, ids and lexical postings, in bytes
+_ROW_OVERHEAD = 600
+
+_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Namespace:
+    """One user's private documents: vectors, chunk text and a lexical index.
+
+    Everything lives under its own directory, so dropping the object from
+    memory loses nothing; reopening it rebuilds the lexical index from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.store = NumpyVectorStore(os.path.join(path, "vectors"), "float16")
+        self.corpus = CorpusStore(os.path.join(path, "corpus.txt"))
+        self.bm25 = BM25Index()
+        self.files = set()
+        for ids, _, metadatas in self.store.iter_records():
+            self.bm25.add(
+                ids,
+                [self.corpus.read(m["text_offset"], m["text_length"]) for m in metadatas],
+                [m["filename"] for m in metadatas]
+            )
+            self.files.update(m["filename"] for m in metadatas)
+
+    def add(self, chunks, embeddings):
+        """Store embedded chunk records (see lab4.chunk_pdf_pages)"""
+        texts = [chunk["text"] for chunk in chunks]
+        spans = self.corpus.append(texts)
+        self.store.upsert(
+            [chunk["id"] for chunk in chunks],
+            embeddings,
+            [
+                {**chunk["metadata"], "text_offset": offset, "text_length": length}
+                for chunk, (offset, length) in zip(chunks, spans)
+            ]
+        )
+        self.bm25.add([chunk["id"] for chunk in chunks], texts, [chunk["metadata"]["filename"] for chunk in chunks])
+        self.files.update(chunk["metadata"]["filename"] for chunk in chunks)
+
+    def count(self):
+        return self.store.count()
+
+    def memory_bytes(self):
+        """Estimated resident size: vectors, text and per-chunk overhead"""
+        rows = self.store.count()
+        return rows * ((self.store.dim or 0) * 2 + _ROW_OVERHEAD) + self.corpus.size()
+
+
+class NamespaceRegistry:
+    """LRU of loaded namespaces kept under a memory budget.
+
+    Over budget, the least recently used namespaces are dropped from memory
+    but stay on disk, and the next get() reloads them. Namespaces idle longer
+    than idle_ttl are deleted from disk as well.
+    """
+
+    def __init__(self, root=NAMESPACE_ROOT, memory_budget=NAMESPACE_MEMORY_BUDGET,
+                 idle_ttl=NAMESPACE_IDLE_TTL, clock=time.time):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.spills = 0
+        self.deletions = 0
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()  # key -> (Namespace, last used)
+        self._last_sweep = 0.0
+
+    def _path(self, key):
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid namespace key {key!r}")
+        return os.path.join(self.root, key)
+
+    def get(self, key, create=False):
+        """The namespace for a key, loading it from disk if it was spilled.
+
+        Returns None when the key has no namespace and create is False.
+        """
+        now = self.clock()
+        with self._lock:
+            self._sweep(now)
+            if key in self._loaded:
+                namespace, _ = self._loaded.pop(key)
+            else:
+                path = self._path(key)
+                if not create and not os.path.isdir(path):
+                    return None
+                namespace = Namespace(path)
+            self._loaded[key] = (namespace, now)
+            # Directory mtime records use for the idle sweep, even while spilled
+            os.utime(namespace.path, (now, now))
+            self._enforce_budget()
+            return namespace
+
+    def rebalance(self):
+        """Re-check the budget, e.g. after a namespace grew"""
+        with self._lock:
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Spill least recently used namespaces; caller holds the lock"""
+        total = sum(namespace.memory_bytes() for namespace, _ in self._loaded.values())
+        # The most recent namespace always stays loaded, even if it alone is over budget
+        while total > self.memory_budget and len(self._loaded) > 1:
+            _, (namespace, _) = self._loaded.popitem(last=False)
+            total -= namespace.memory_bytes()
+            self.spills += 1
+
+    def _sweep(self, now):
+        """Drop and delete namespaces idle past the TTL; caller holds the lock"""
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key in self._loaded:
+                last_used = self._loaded[key][1]
+            else:
+                try:
+                    last_used = os.path.getmtime(path)
+                except OSError:
+                    continue
+            if now - last_used > self.idle_ttl:
+                self._loaded.pop(key, None)
+                shutil.rmtree(path, ignore_errors=True)
+                self.deletions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": len(self._loaded),
+                "memory_bytes": sum(namespace.memory_bytes() for namespace, _ in self._loaded.values()),
+                "memory_budget": self.memory_budget,
+                "spills": self.spills,
+                "deletions": self.deletions,
+            }
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import telemetry
+from token_utils import ENCODING_NAME, get_encoding
+
+# The manifest lives next to the persisted ChromaDB so the two stay in step
+MANIFEST_FILENAME = "lab4_manifest.json"
+
+
+def manifest_path(store_path):
+    """Location of the ingestion manifest for a vector store directory"""
+    return os.path.join(store_path, MANIFEST_FILENAME)
+
+
+def load_manifest(path):
+    """Load the ingestion manifest, or an empty one if it is missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def save_manifest(path, manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def hash_file(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_pdf_files(pdf_directory):
+    """Sorted PDF filenames in a directory (empty if the directory is missing)"""
+    if not os.path.isdir(pdf_directory):
+        return []
+    return sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith(".pdf"))
+
+
+def plan_sync(pdf_directory, manifest):
+    """Compare the PDF directory against the manifest.
+
+    Returns a dict with:
+      - "changed": {filename: fingerprint} for new or modified files
+      - "unchanged": [filename, ...] for files that need no work
+      - "deleted": [filename, ...] for manifest entries whose file is gone
+      - "touched": {filename: fingerprint} for files whose size/mtime moved
+        but whose content hash did not (manifest only, no re-embedding)
+
+    Size and mtime are checked first so an unchanged corpus is never read;
+    the content hash is only computed when those differ.
+    """
+    plan = {"changed": {}, "unchanged": [], "deleted": [], "touched": {}}
+    present = set()
+
+    for filename in list_pdf_files(pdf_directory):
+        present.add(filename)
+        file_path = os.path.join(pdf_directory, filename)
+        stat = os.stat(file_path)
+        entry = manifest.get(filename)
+
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            plan["unchanged"].append(filename)
+            continue
+
+        fingerprint = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": hash_file(file_path),
+        }
+        if entry and entry.get("sha256") == fingerprint["sha256"]:
+            plan["touched"][filename] = fingerprint
+        else:
+            plan["changed"][filename] = fingerprint
+
+    plan["deleted"] = sorted(name for name in manifest if name not in present)
+    return plan
+
+
+class IngestProgress:
+    """Thread-safe progress of a sync, written by the worker and read by the UI.
+
+    A file counts as done once its chunks are stored and it is in the
+    manifest. The ETA extrapolates from the bytes of PDF processed so far.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.started_at = clock()
+        self.finished_at = None
+        self.total_files = 0
+        self.total_bytes = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.bytes_done = 0
+        self.chunks_done = 0
+        self.message = "Checking PDF files..."
+        self.errors = []
+
+    def start(self, files, message=""):
+        """Begin tracking {filename: fingerprint} files to be embedded"""
+        with self._lock:
+            self.total_files = len(files)
+            self.total_bytes = sum(fingerprint.get("size", 0) for fingerprint in files.values())
+            self.message = message
+
+    def file_done(self, size, chunks=0, failed=False):
+        with self._lock:
+            self.files_done += 1
+            self.files_failed += int(failed)
+            self.bytes_done += size
+            self.chunks_done += chunks
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def finish(self, message=None):
+        with self._lock:
+            self.finished_at = self.clock()
+            if message is not None:
+                self.message = message
+
+    def snapshot(self):
+        """Plain dict of the current counters plus elapsed time and ETA in seconds"""
+        with self._lock:
+            now = self.finished_at or self.clock()
+            elapsed = now - self.started_at
+            eta = None
+            if self.finished_at is None and self.bytes_done:
+                eta = elapsed * (self.total_bytes - self.bytes_done) / self.bytes_done
+            return {
+                "running": self.finished_at is None,
+                "total_files": self.total_files,
+                "files_done": self.files_done,
+                "files_failed": self.files_failed,
+                "chunks_done": self.chunks_done,
+                "fraction": self.bytes_done / self.total_bytes if self.total_bytes else 0.0,
+                "elapsed_seconds": elapsed,
+                "eta_seconds": eta,
+                "message": self.message,
+                "errors": list(self.errors),
+            }
+
+
+# Chunking defaults: text-embedding-3-small accepts 8191 tokens, but smaller
+# overlapping chunks retrieve focused passages instead of whole files
+CHUNK_TOKENS = 400
+CHUNK_OVERLAP = 60
+
+
+def join_pages(pages):
+    """Document text as stored and sliced by chunk offsets"""
+    return "\n".join(pages)
+
+
+def chunk_pages(pages, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, encoding_name=ENCODING_NAME):
+    """Split page texts into overlapping, token-bounded chunks.
+
+    Each chunk is a dict with "text", "page" (1-based page of the first token),
+    "page_end", "start"/"end" (character offsets into join_pages(pages)) and
+    "tokens". Chunk text is always join_pages(pages)[start:end].
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+
+    encoding = get_encoding(encoding_name)
+    token_pages = []
+    token_starts = []
+    page_base = 0
+    for page_number, page_text in enumerate(pages, start=1):
+        tokens = encoding.encode(page_text, disallowed_special=())
+        if tokens:
+            _, offsets = encoding.decode_with_offsets(tokens)
+            token_starts.extend(page_base + offset for offset in offsets)
+            token_pages.extend([page_number] * len(tokens))
+        page_base += len(page_text) + 1  # "\n" separator from join_pages
+
+    text = join_pages(pages)
+    chunks = []
+    step = max_tokens - overlap
+    n_tokens = len(token_starts)
+    for window_start in range(0, n_tokens, step):
+        window_end = min(window_start + max_tokens, n_tokens)
+        start = token_starts[window_start]
+        end = token_starts[window_end] if window_end < n_tokens else len(text)
+        chunk_text = text[start:end]
+        if chunk_text.strip():
+            chunks.append({
+                "text": chunk_text,
+                "page": token_pages[window_start],
+                "page_end": token_pages[window_end - 1],
+                "start": start,
+                "end": end,
+                "tokens": window_end - window_start,
+            })
+        if window_end == n_tokens:
+            break
+    return chunks
+
+
+def chunk_id(filename, index):
+    """Stable vector id for the index-th chunk of a file"""
+    return f"{filename}::{index}"
+
+
+# Large PDFs are split into page ranges of this size so one file can use several cores
+PAGES_PER_TASK = 16
+
+
+def count_pdf_pages(path):
+    """Number of pages in a PDF (reads the page tree, not the page contents)"""
+    import PyPDF2
+    with open(path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def extract_pdf_pages(path, start=0, end=None):
+    """Extract the text of pages [start, end) of a PDF as a list of strings"""
+    import PyPDF2
+    with open(path, "rb") as f:
+        pages = PyPDF2.PdfReader(f).pages
+        end = len(pages) if end is None else min(end, len(pages))
+        return [pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _page_ranges(page_count, pages_per_task):
+    return [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)] or [(0, 0)]
+
+
+def iter_pdf_pages(paths, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    """Extract PDFs across a process pool, yielding (path, pages, error) per file.
+
+    Files are yielded as soon as all of their page ranges finish, in completion
+    order, so callers can chunk and embed while other files are still parsing.
+    Only a bounded number of files is in flight at once, which keeps peak memory
+    to a few documents rather than the whole directory. On failure pages is None
+    and error holds the exception.
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    max_workers = max_workers or os.cpu_count() or 1
+
+    # A pool is not worth its startup cost for a single worker
+    if max_workers == 1:
+        for path in paths:
+            try:
+                with telemetry.span("pdf.parse", workers=1) as fields:
+                    pages = extract_pdf_pages(path)
+                    fields["pages"] = len(pages)
+            except Exception as e:
+                yield path, None, e
+                continue
+            yield path, pages, None
+        return
+
+    # "spawn" avoids forking the threaded Streamlit server process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        queue = list(reversed(paths))
+        results = {}  # path -> list of per-range page lists
+        remaining = {}  # path -> ranges still running
+        futures = {}  # future -> (path, range index)
+        failed = {}
+        started = {}  # path -> submit time, for parse latency
+        max_in_flight = max_workers * 2
+
+        def submit_next():
+            path = queue.pop()
+            started[path] = time.perf_counter()
+            try:
+                ranges = _page_ranges(count_pdf_pages(path), pages_per_task)
+            except Exception as e:
+                failed[path] = e
+                return
+            results[path] = [None] * len(ranges)
+            remaining[path] = len(ranges)
+            for index, (start, end) in enumerate(ranges):
+                futures[pool.submit(extract_pdf_pages, path, start, end)] = (path, index)
+
+        while queue or futures or failed:
+            while queue and len(futures) < max_in_flight:
+                submit_next()
+            for path in list(failed):
+                yield path, None, failed.pop(path)
+            if not futures:
+                continue
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, index = futures.pop(future)
+                if path not in results:
+                    continue  # an earlier range of this file already failed
+                try:
+                    results[path][index] = future.result()
+                except Exception as e:
+                    del results[path], remaining[path]
+                    yield path, None, e
+                    continue
+                remaining[path] -= 1
+                if remaining[path] == 0:
+                    del remaining[path]
+                    pages = [page for chunk in results.pop(path) for page in chunk]
+                    telemetry.record(
+                        "pdf.parse", (time.perf_counter() - started.pop(path)) * 1000,
+                        workers=max_workers, pages=len(pages)
+                    )
+                    yield path, pages, None
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+
+import openai
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class AsyncRateLimiter:
+    """Token buckets for requests per minute and tokens per minute.
+
+    acquire(tokens) waits until both buckets can cover one request of that
+    size, so a batch runs as fast as the API quota allows and no faster.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, clock=time.monotonic):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.clock = clock
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens):
+        # A request bigger than the whole bucket would wait forever; let it drain the bucket instead
+        tokens = min(tokens, self.tpm)
+        # The lock keeps waiters in arrival order instead of letting small requests starve big ones
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                )
+                await asyncio.sleep(wait)
+
+
+def estimate_tokens(text, completion_tokens=0):
+    """Rough token count (about 4 characters per token) for rate limiting"""
+    return len(text) // 4 + 1 + completion_tokens
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, if it said"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def call_with_retries(make_call, max_attempts=5, base_delay=1.0, max_delay=30.0):
+    """Await make_call(), retrying retryable API errors with jittered exponential backoff"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await make_call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_attempts:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+                delay = random.uniform(delay / 2, delay)
+            await asyncio.sleep(delay)
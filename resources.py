@@ -0,0 +1,187 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from bm25_index import BM25Index
+from claim_cache import ClaimCache
+from corpus_store import CorpusStore
+from namespaces import NAMESPACE_MEMORY_BUDGET, NamespaceRegistry
+from ttl_cache import TTLCache
+from vector_store import NUMPY_DTYPES, ChromaVectorStore, NumpyVectorStore
+
+# Everything here is created once per process and shared by every session
+# (OpenAI clients live in llm_gateway);
+# st.cache_resource makes concurrent first calls wait for a single construction.
+
+CHROMADB_PATH = "./ChromaDB_for_lab"
+VECTOR_STORE_PATH = "./VectorStore_for_lab"
+LAB4_COLLECTION = "Lab4Collection"
+
+# Query caches: repeated questions skip the embedding call and the vector search
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 15 * 60
+
+# Weather changes slowly; one upstream call per city per window is plenty
+WEATHER_CACHE_TTL = 10 * 60
+WEATHER_CACHE_SIZE = 512
+
+# Summaries of uploaded documents (Lab 2)
+SUMMARY_CACHE_SIZE = 512
+SUMMARY_CACHE_TTL = 6 * 60 * 60
+
+# Answers to questions about uploaded documents (Lab 1)
+ANSWER_CACHE_SIZE = 2048
+ANSWER_CACHE_TTL = 6 * 60 * 60
+
+# (connect, read) timeouts for plain HTTP calls
+HTTP_TIMEOUT = (3.05, 10)
+
+
+def import_chromadb():
+    """Import chromadb only for the pages that need it.
+
+    ChromaDB needs a newer SQLite than some hosts ship, so pysqlite3 is swapped
+    in for sqlite3 first.
+    """
+    if 'chromadb' not in sys.modules:
+        __import__('pysqlite3')
+        sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+    import chromadb
+    return chromadb
+
+
+@st.cache_resource
+def get_background_executor():
+    """Small shared thread pool for work kept off the request path"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+
+@st.cache_resource
+def get_summary_cache():
+    """Finished summaries and reduced document sources, shared across sessions"""
+    return TTLCache(maxsize=SUMMARY_CACHE_SIZE, ttl=SUMMARY_CACHE_TTL, name="summary")
+
+
+@st.cache_resource
+def get_answer_cache():
+    """Answers keyed by (document hash, question, model), shared across sessions"""
+    return TTLCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, name="doc_answers")
+
+
+@st.cache_resource
+def get_http_session():
+    """Shared requests session with a keep-alive connection pool and retries"""
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_weather_cache(ttl=WEATHER_CACHE_TTL):
+    """Location -> current weather, with concurrent lookups for one city coalesced"""
+    return TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=ttl, name="weather")
+
+
+@st.cache_resource
+def get_claim_cache():
+    """Fact-check verdicts shared by every user and session"""
+    return ClaimCache()
+
+
+@st.cache_resource
+def get_chroma_client(path=CHROMADB_PATH):
+    """Shared persistent ChromaDB client"""
+    return import_chromadb().PersistentClient(path=path)
+
+
+@st.cache_resource
+def get_lab4_collection(path=CHROMADB_PATH, name=LAB4_COLLECTION):
+    """Shared handle to the Lab 4 collection"""
+    return get_chroma_client(path).get_or_create_collection(
+        name=name,
+        metadata={"hnsw:space": "cosine"}
+    )
+
+
+@st.cache_resource
+def get_lab4_store(backend="chroma"):
+    """Shared Lab 4 vector store for a backend (see vector_store.VECTOR_BACKENDS)"""
+    if backend == "chroma":
+        return ChromaVectorStore(get_lab4_collection(), CHROMADB_PATH)
+    dtype = NUMPY_DTYPES[backend]
+    return NumpyVectorStore(os.path.join(VECTOR_STORE_PATH, f"{LAB4_COLLECTION}-{dtype}"), dtype)
+
+
+@st.cache_resource
+def get_corpus_store(path):
+    """Shared memory-mapped chunk text file"""
+    return CorpusStore(path)
+
+
+@st.cache_resource
+def get_namespace_registry():
+    """Per-user upload namespaces for Lab 4.
+
+    NAMESPACE_MEMORY_BUDGET_MB overrides how much of them stays loaded.
+    """
+    budget_mb = os.environ.get("NAMESPACE_MEMORY_BUDGET_MB")
+    budget = int(float(budget_mb) * 1024 * 1024) if budget_mb else NAMESPACE_MEMORY_BUDGET
+    return NamespaceRegistry(memory_budget=budget)
+
+
+@st.cache_resource
+def get_bm25_index(name=LAB4_COLLECTION):
+    """Shared lexical index kept alongside a vector store"""
+    return BM25Index()
+
+
+@st.cache_resource
+def get_lab4_index_state(backend="chroma"):
+    """Process-wide handle on a Lab 4 store's background sync.
+
+    The lock makes sure only one session starts ingestion; "progress" holds
+    the running (or finished) sync's IngestProgress and "failures" counts
+    the failed syncs in a row.
+    """
+    return {"lock": threading.Lock(), "progress": None, "failures": 0}
+
+
+@st.cache_resource
+def get_query_embedding_cache():
+    """Normalized query text -> query embedding"""
+    return TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL, name="query_embedding")
+
+
+@st.cache_resource
+def get_retrieval_cache():
+    """(collection, version, normalized query, top_k) -> search results"""
+    return TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL, name="retrieval")
+
+
+@st.cache_resource
+def _collection_versions():
+    return {"lock": threading.Lock(), "versions": {}}
+
+
+def get_collection_version(name):
+    """Counter that changes every time ingestion writes to a collection"""
+    state = _collection_versions()
+    with state["lock"]:
+        return state["versions"].get(name, 0)
+
+
+def bump_collection_version(name):
+    """Record a write to a collection, invalidating its cached search results"""
+    state = _collection_versions()
+    with state["lock"]:
+        state["versions"][name] = state["versions"].get(name, 0) + 1
+    get_retrieval_cache().clear()
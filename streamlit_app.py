@@ -6,7 +6,8 @@ lab3_page = st.Page("lab3.py", title="Lab 3", icon="🖥️")
 lab4_page = st.Page("lab4.py", title="Lab 4", icon="🖥️")
 lab5_page = st.Page("lab5.py", title="Lab 5", icon="🖥️")
 lab6_page = st.Page("lab6.py", title="Lab 6", icon="🖥️", default=True)
+metrics_page = st.Page("metrics.py", title="Metrics", icon="📊")
 
-pg = st.navigation([lab1_page, lab2_page, lab3_page, lab4_page, lab5_page, lab6_page])
+pg = st.navigation([lab1_page, lab2_page, lab3_page, lab4_page, lab5_page, lab6_page, metrics_page])
 st.set_page_config(page_title="Nikita's Labs", page_icon="📄")
 pg.run()
\ No newline at end of file
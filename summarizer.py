@@ -0,0 +1,193 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from rag_ingest import chunk_pages
+from token_utils import count_tokens
+
+SUMMARY_FORMATS = {
+    "100 Words": "in 100 words",
+    "2 Paragraphs": "in 2 paragraphs",
+    "5 Bullet Points": "in 5 bullet points",
+}
+
+# Map chunks leave room in an 8k context (gpt-4) for the prompt and the partial summary
+MAP_CHUNK_TOKENS = 3000
+MAP_CHUNK_OVERLAP = 100
+MAP_SUMMARY_TOKENS = 300
+# Partial summaries are merged in groups no bigger than this before the final pass
+REDUCE_INPUT_TOKENS = 3000
+MAX_PARALLEL_CALLS = 8
+# Every final summary and translation, streamed or precomputed, has the same bound,
+# so a cached variant is the same whichever path produced it
+SUMMARY_MAX_TOKENS = 800
+
+MAP_PROMPT = """Summarize this section of a longer document. Keep the key facts, names, numbers and conclusions.
+
+Section {index} of {total}:
+{text}"""
+
+REDUCE_PROMPT = """These are summaries of consecutive sections of one document. Merge them into a single summary that keeps the key facts, names, numbers and conclusions.
+
+{text}"""
+
+
+TRANSLATE_PROMPT = """Translate this summary into {language}. Keep its format (word count, paragraphs or bullet points). Reply with the translation only.
+
+{text}"""
+
+
+def document_hash(document):
+    """Fingerprint of an uploaded document's text"""
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+def summary_key(doc_hash, summary_type, language, model):
+    """Cache key for one finished summary variant"""
+    return ("summary", doc_hash, summary_type, language, model)
+
+
+def cached_variant(cache, doc_hash, summary_type, model, languages):
+    """A finished summary of this type in any of languages, or None"""
+    for language in languages:
+        summary = cache.peek(summary_key(doc_hash, summary_type, language, model))
+        if summary is not None:
+            return summary
+    return None
+
+
+def final_prompt(document_text, summary_type, language):
+    """Prompt for the user-facing summary"""
+    return (
+        f"Summarize the document {SUMMARY_FORMATS[summary_type]}. "
+        f"Write the summary in {language}.\n\n{document_text}"
+    )
+
+
+def split_document(document, chunk_tokens=MAP_CHUNK_TOKENS, overlap=MAP_CHUNK_OVERLAP):
+    """Token-bounded, slightly overlapping pieces of a document"""
+    return [chunk["text"] for chunk in chunk_pages([document], chunk_tokens, overlap)]
+
+
+def _complete(client, model, prompt, max_tokens):
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+
+def map_summaries(client, model, chunks, max_workers=MAX_PARALLEL_CALLS):
+    """Summarize every chunk concurrently, keeping document order"""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        return list(pool.map(
+            lambda item: _complete(
+                client, model,
+                MAP_PROMPT.format(index=item[0] + 1, total=len(chunks), text=item[1]),
+                MAP_SUMMARY_TOKENS
+            ),
+            enumerate(chunks)
+        ))
+
+
+def group_by_tokens(texts, max_tokens=REDUCE_INPUT_TOKENS):
+    """Consecutive groups of texts whose combined size stays under max_tokens"""
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def reduce_summaries(client, model, summaries, max_workers=MAX_PARALLEL_CALLS):
+    """Merge partial summaries level by level until they fit one final prompt"""
+    while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > REDUCE_INPUT_TOKENS:
+        groups = group_by_tokens(summaries)
+        if len(groups) == len(summaries):
+            break  # each summary is already as big as a group; merging can't shrink them
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+            summaries = list(pool.map(
+                lambda group: _complete(client, model, REDUCE_PROMPT.format(text="\n\n".join(group)), MAP_SUMMARY_TOKENS),
+                groups
+            ))
+    return summaries
+
+
+def summary_source(client, model, document, cache=None):
+    """Text the final summary is written from: the document itself, or its map-reduced partials.
+
+    With a cache, the expensive map-reduce runs once per (document, model) and
+    is shared by every summary type and language.
+    """
+    def build():
+        chunks = split_document(document)
+        if len(chunks) <= 1:
+            return document
+        return "\n\n".join(reduce_summaries(client, model, map_summaries(client, model, chunks)))
+
+    if cache is None:
+        return build()
+    return cache.get_or_compute(("source", document_hash(document), model), build)
+
+
+def _stream_text(client, model, prompt):
+    stream = client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def summarize_document(client, model, document, summary_type, language, cache=None):
+    """Stream a summary of a document of any length.
+
+    Short documents go straight to the final prompt. Longer ones are split into
+    chunks that are summarized in parallel (map), merged hierarchically
+    (reduce), and the final formatting pass is streamed. Yields text deltas for
+    st.write_stream.
+    """
+    source = summary_source(client, model, document, cache)
+    yield from _stream_text(client, model, final_prompt(source, summary_type, language))
+
+
+def translate_summary(client, model, summary, language):
+    """Stream an existing summary translated into another language"""
+    yield from _stream_text(client, model, TRANSLATE_PROMPT.format(language=language, text=summary))
+
+
+def precompute_summaries(client, model, document, summary_types, language, cache, other_languages=()):
+    """Fill the cache with summary variants the user is likely to ask for next.
+
+    A variant already cached in one of other_languages is translated rather
+    than written again from the document.
+    """
+    doc_hash = document_hash(document)
+    for summary_type in summary_types:
+        key = summary_key(doc_hash, summary_type, language, model)
+        if cache.peek(key) is not None or cache.in_flight(key) is not None:
+            continue
+
+        def compute(summary_type=summary_type):
+            translated_from = cached_variant(cache, doc_hash, summary_type, model, other_languages)
+            if translated_from is not None:
+                prompt = TRANSLATE_PROMPT.format(language=language, text=translated_from)
+            else:
+                prompt = final_prompt(summary_source(client, model, document, cache), summary_type, language)
+            return _complete(client, model, prompt, SUMMARY_MAX_TOKENS)
+
+        try:
+            cache.get_or_compute(key, compute)
+        except Exception:
+            # Speculative work: the variant is simply generated on demand instead
+            continue
@@ -0,0 +1,115 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import numpy as np
+
+TELEMETRY_PATH = "./.cache/telemetry/metrics.jsonl"
+TELEMETRY_MAX_BYTES = 5 * 1024 * 1024
+TELEMETRY_BACKUPS = 5
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def _get_logger():
+    """JSONL writer backed by a size-rotated file; created on first use"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(TELEMETRY_PATH), exist_ok=True)
+            handler = RotatingFileHandler(TELEMETRY_PATH, maxBytes=TELEMETRY_MAX_BYTES, backupCount=TELEMETRY_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("document_qa.telemetry")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _logger = logger
+        return _logger
+
+
+def record(stage, duration_ms=None, **fields):
+    """Write one telemetry event; never raises into the caller"""
+    event = {"ts": time.time(), "stage": stage, **fields}
+    if duration_ms is not None:
+        event["duration_ms"] = round(duration_ms, 3)
+    try:
+        _get_logger().info(json.dumps(event, default=str))
+    except Exception:
+        pass
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a block and record it as one event.
+
+    The yielded dict can be filled with extra fields (token counts, sizes)
+    before the block ends. Exceptions are recorded and re-raised.
+    """
+    start = time.perf_counter()
+    extra = dict(fields)
+    try:
+        yield extra
+    except BaseException as e:
+        extra["error"] = type(e).__name__
+        raise
+    finally:
+        record(stage, (time.perf_counter() - start) * 1000, **extra)
+
+
+def record_cache(name, hits=0, misses=0):
+    """Record cache lookups for the named cache"""
+    record(f"cache.{name}", hits=hits, misses=misses)
+
+
+def load_events(since=None, path=TELEMETRY_PATH):
+    """Read events from the current and rotated files, oldest first"""
+    events = []
+    for file_path in sorted(glob.glob(path + ".*"), reverse=True) + [path]:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since is None or event.get("ts", 0) >= since:
+                        events.append(event)
+        except OSError:
+            continue
+    return events
+
+
+def summarize_events(events):
+    """Per-stage counts, latency percentiles, token totals and cache hit rates"""
+    stages = {}
+    for event in events:
+        stages.setdefault(event["stage"], []).append(event)
+
+    rows = []
+    for stage, stage_events in sorted(stages.items()):
+        durations = np.array([e["duration_ms"] for e in stage_events if "duration_ms" in e], dtype=float)
+        hits = sum(e.get("hits", 0) for e in stage_events)
+        misses = sum(e.get("misses", 0) for e in stage_events)
+        row = {
+            "stage": stage,
+            "count": len(stage_events),
+            "errors": sum(1 for e in stage_events if e.get("error")),
+            "p50_ms": None,
+            "p95_ms": None,
+            "p99_ms": None,
+            "prompt_tokens": sum(e.get("prompt_tokens", 0) for e in stage_events),
+            "completion_tokens": sum(e.get("completion_tokens", 0) for e in stage_events),
+            "cache_hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+        if durations.size:
+            row["p50_ms"], row["p95_ms"], row["p99_ms"] = (
+                round(float(value), 1) for value in np.percentile(durations, [50, 95, 99])
+            )
+        rows.append(row)
+    return rows
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The app modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def byte_encoding(monkeypatch):
+    """Byte-level tiktoken encoding registered under a test name.
+
+    It needs no downloaded BPE files, and every UTF-8 byte is its own token,
+    so cuts can land inside multi-byte characters.
+    """
+    import tiktoken
+    import token_utils
+
+    encoding = tiktoken.Encoding(
+        "test_bytes",
+        pat_str=r"""\S+|\s+""",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    monkeypatch.setitem(token_utils._encodings, "test_bytes", encoding)
+    return "test_bytes"
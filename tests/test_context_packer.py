@@ -0,0 +1,43 @@
+import numpy as np
+
+from context_packer import MIN_PARTIAL_TOKENS, mmr_select, pack_passages
+from token_utils import count_tokens, truncate_tokens
+
+
+def test_truncate_drops_a_split_character(byte_encoding):
+    text = truncate_tokens("é" * 10, 5, byte_encoding)
+    assert text == "éé"
+    assert "�" not in text
+
+
+def test_pack_fits_budget_with_multibyte_text(byte_encoding):
+    passages = [("a", "é" * 300), ("b", "ü€" * 100)]
+    for budget in (0, 50, 100, 150, 151, 333, 2000):
+        context, used = pack_passages(passages, budget, byte_encoding)
+        assert count_tokens(context, byte_encoding) <= budget
+        assert used == sorted(used)
+
+
+def test_pack_takes_whole_passages_in_order(byte_encoding):
+    passages = [("first", "alpha " * 20), ("second", "beta " * 20)]
+    context, used = pack_passages(passages, 10_000, byte_encoding)
+    assert used == [0, 1]
+    assert context.index("Passage 1: first") < context.index("Passage 2: second")
+
+
+def test_pack_truncates_a_skipped_passage_to_fill_the_budget(byte_encoding):
+    passages = [("short", "x" * 50), ("long", "y" * 5000)]
+    budget = 50 + MIN_PARTIAL_TOKENS * 3
+    context, used = pack_passages(passages, budget, byte_encoding)
+    assert used == [0, 1]
+    assert count_tokens(context, byte_encoding) == budget
+
+
+def test_mmr_prefers_new_evidence_over_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([
+        [0.9, 0.1, 0.0],
+        [0.9, 0.1, 0.0],  # duplicate of the first
+        [0.7, 0.0, 0.7],
+    ])
+    assert mmr_select(query, candidates, 2, lambda_mult=0.5) == [0, 2]
@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pytest
+
+import vector_store
+from vector_store import NumpyVectorStore
+
+DIM = 8
+
+
+def embedding(seed):
+    return np.random.default_rng(seed).standard_normal(DIM).tolist()
+
+
+def add(store, filename, seeds):
+    ids = [f"{filename}-{seed}" for seed in seeds]
+    store.upsert(
+        ids,
+        [embedding(seed) for seed in seeds],
+        [{"filename": filename, "seed": seed} for seed in seeds],
+        [f"text {seed}" for seed in seeds],
+    )
+    return ids
+
+
+def best_match(store, seed):
+    doc_id, metadata, similarity = store.query(embedding(seed), 1)[0]
+    return doc_id, metadata["seed"], similarity
+
+
+def stored_ids(store):
+    return sorted(doc_id for ids, _, _ in store.iter_records() for doc_id in ids)
+
+
+@pytest.fixture
+def small_compaction(monkeypatch):
+    monkeypatch.setattr(vector_store, "COMPACT_MIN_DEAD_ROWS", 4)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_upsert_delete_compact_and_reload(tmp_path, small_compaction, dtype):
+    store = NumpyVectorStore(str(tmp_path), dtype)
+    a_ids = add(store, "a.pdf", range(0, 6))
+    b_ids = add(store, "b.pdf", range(10, 13))
+    assert store.count() == 9
+    assert best_match(store, 11)[:2] == ("b.pdf-11", 11)
+    assert best_match(store, 11)[2] == pytest.approx(1.0, abs=0.02)
+
+    # Upserting an existing id replaces its row
+    store.upsert(["b.pdf-10"], [embedding(99)], [{"filename": "b.pdf", "seed": 99}], ["replaced"])
+    assert store.count() == 9
+    assert best_match(store, 99)[:2] == ("b.pdf-10", 99)
+    assert store.get(["b.pdf-10"], include_documents=True)[0][1] == "replaced"
+
+    # Six of a.pdf's rows plus the replaced one are dead, outnumbering the three live rows
+    store.delete_file("a.pdf")
+    assert store._generation == 1
+    assert store.count() == 3
+    assert stored_ids(store) == sorted(b_ids)
+    assert not os.path.exists(tmp_path / "vectors.bin")
+    assert os.path.exists(tmp_path / "vectors.1.bin")
+    assert store.get(a_ids) == []
+
+    store.upsert(["c.pdf-20"], [embedding(20)], [{"filename": "c.pdf", "seed": 20}])
+    expected_vectors = store.vectors(b_ids + ["c.pdf-20"])
+
+    reloaded = NumpyVectorStore(str(tmp_path), dtype)
+    assert reloaded._generation == 1
+    assert reloaded.count() == 4
+    assert stored_ids(reloaded) == sorted(b_ids + ["c.pdf-20"])
+    assert best_match(reloaded, 99)[:2] == ("b.pdf-10", 99)
+    assert best_match(reloaded, 20)[:2] == ("c.pdf-20", 20)
+    for doc_id, vector in reloaded.vectors(b_ids + ["c.pdf-20"]).items():
+        np.testing.assert_allclose(vector, expected_vectors[doc_id])
+    assert reloaded.get(["b.pdf-12"], include_documents=True)[0][1] == "text 12"
+
+
+def test_reload_rejects_a_different_dtype(tmp_path):
+    add(NumpyVectorStore(str(tmp_path), "float16"), "a.pdf", [1])
+    with pytest.raises(ValueError):
+        NumpyVectorStore(str(tmp_path), "int8")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_torn_record_line_is_dropped_on_reload(tmp_path, dtype):
+    store = NumpyVectorStore(str(tmp_path), dtype)
+    add(store, "a.pdf", [1, 2])
+
+    # A crash mid-upsert: the vector row was written, its record only in part
+    rows, scales = store._encode(vector_store._unit_rows([embedding(3)]))
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(rows.tobytes())
+    if scales is not None:
+        with open(tmp_path / "scales.bin", "ab") as f:
+            f.write(scales.tobytes())
+    with open(tmp_path / "records.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "a.pdf-3", "metad')
+
+    reloaded = NumpyVectorStore(str(tmp_path), dtype)
+    assert reloaded.count() == 2
+    assert stored_ids(reloaded) == ["a.pdf-1", "a.pdf-2"]
+    assert (tmp_path / "records.jsonl").read_bytes().endswith(b"\n")
+    assert os.path.getsize(tmp_path / "vectors.bin") == 2 * DIM * reloaded.dtype.itemsize
+
+    # Later appends line up with their vectors again
+    add(reloaded, "a.pdf", [3])
+    again = NumpyVectorStore(str(tmp_path), dtype)
+    assert again.count() == 3
+    for seed in (1, 2, 3):
+        assert best_match(again, seed)[:2] == (f"a.pdf-{seed}", seed)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_orphaned_generation_files_are_ignored_and_removed(tmp_path, dtype):
+    store = NumpyVectorStore(str(tmp_path), dtype)
+    add(store, "a.pdf", [1, 2, 3])
+
+    # Files of a compaction that never reached its meta.json switch
+    for name in ("vectors.1.bin", "scales.1.bin", "records.1.jsonl"):
+        (tmp_path / name).write_bytes(b"partial")
+
+    reloaded = NumpyVectorStore(str(tmp_path), dtype)
+    assert reloaded._generation == 0
+    assert reloaded.count() == 3
+    assert best_match(reloaded, 2)[:2] == ("a.pdf-2", 2)
+    for name in ("vectors.1.bin", "scales.1.bin", "records.1.jsonl"):
+        assert not os.path.exists(tmp_path / name)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compaction_interrupted_before_commit_keeps_old_generation(tmp_path, small_compaction, monkeypatch, dtype):
+    store = NumpyVectorStore(str(tmp_path), dtype)
+    add(store, "a.pdf", range(0, 6))
+    add(store, "b.pdf", [10, 11])
+
+    write_meta = NumpyVectorStore._write_meta
+
+    def crash_before_switch(self, generation):
+        if generation != self._generation:
+            raise OSError("simulated crash")
+        write_meta(self, generation)
+
+    monkeypatch.setattr(NumpyVectorStore, "_write_meta", crash_before_switch)
+    with pytest.raises(OSError):
+        store.delete_file("a.pdf")
+    assert os.path.exists(tmp_path / "records.1.jsonl")
+    monkeypatch.setattr(NumpyVectorStore, "_write_meta", write_meta)
+
+    # The tombstones were logged before compacting, so the delete itself survives
+    reloaded = NumpyVectorStore(str(tmp_path), dtype)
+    assert reloaded._generation == 0
+    assert stored_ids(reloaded) == ["b.pdf-10", "b.pdf-11"]
+    assert best_match(reloaded, 11)[:2] == ("b.pdf-11", 11)
+    assert not os.path.exists(tmp_path / "records.1.jsonl")
+
+    # The next compaction starts cleanly from the surviving generation
+    add(reloaded, "c.pdf", [20])
+    reloaded.delete_file("b.pdf")
+    assert reloaded._generation == 1
+    assert stored_ids(NumpyVectorStore(str(tmp_path), dtype)) == ["c.pdf-20"]
@@ -0,0 +1,6 @@
+import re
+
+
+def normalize_query(query):
+    """Cache key for a question: case, whitespace and trailing punctuation don't matter"""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.").strip().lower()
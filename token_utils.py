@@ -0,0 +1,26 @@
+ENCODING_NAME = "cl100k_base"
+
+_encodings = {}
+
+
+def get_encoding(encoding_name=ENCODING_NAME):
+    """Cached tiktoken encoding (loading one is slow)"""
+    if encoding_name not in _encodings:
+        import tiktoken
+        _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return _encodings[encoding_name]
+
+
+def count_tokens(text, encoding_name=ENCODING_NAME):
+    """Number of tokens in a string"""
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, encoding_name=ENCODING_NAME):
+    """Cut text down to at most max_tokens tokens"""
+    encoding = get_encoding(encoding_name)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    # A cut inside a multi-byte character drops that character instead of adding U+FFFD
+    return encoding.decode_bytes(tokens[:max(max_tokens, 0)]).decode("utf-8", errors="ignore")
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import telemetry
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after ttl seconds.
+
+    get_or_compute() coalesces concurrent misses: while one caller computes a
+    key, other callers asking for the same key wait for that result instead of
+    starting their own computation. Named caches report lookups to telemetry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=600, clock=time.monotonic, name=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Return (found, value); caller holds the lock"""
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _store(self, key, value):
+        """Insert and evict down to maxsize; caller holds the lock"""
+        self._data[key] = (self.clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _count(self, hit):
+        """Update counters; caller holds the lock"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name:
+            telemetry.record_cache(self.name, hits=int(hit), misses=int(not hit))
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            self._count(found)
+            return value if found else default
+
+    def peek(self, key, default=None):
+        """Like get(), but without touching the hit/miss counters or LRU order"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self.clock():
+                return default
+            return entry[1]
+
+    def in_flight(self, key):
+        """Future for a get_or_compute() of key that is still running, or None"""
+        with self._lock:
+            return self._in_flight.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing it at most once across threads"""
+        with self._lock:
+            found, value = self._lookup(key)
+            self._count(found)
+            if found:
+                return value
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._in_flight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._data),
+            }
@@ -0,0 +1,372 @@
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+# "chroma" is the persistent ChromaDB collection; the numpy backends are
+# exact-search matrices memory-mapped from disk, stored as float16 or int8
+VECTOR_BACKENDS = ("chroma", "numpy", "numpy-int8")
+NUMPY_DTYPES = {"numpy": "float16", "numpy-int8": "int8"}
+
+# Rows scored per block, so float16/int8 rows are widened a slice at a time
+QUERY_BLOCK_ROWS = 2048
+# Rewrite the files once deleted rows outnumber live ones (and there are this many)
+COMPACT_MIN_DEAD_ROWS = 1024
+# Files holding rows; each compaction writes a new generation of them
+_DATA_FILES = ("vectors.bin", "scales.bin", "records.jsonl")
+
+
+def _unit_rows(embeddings):
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class ChromaVectorStore:
+    """Vector store interface over a ChromaDB collection"""
+
+    backend = "chroma"
+
+    def __init__(self, collection, path):
+        self.collection = collection
+        self.name = collection.name
+        self.path = path
+
+    def count(self):
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def delete_file(self, filename):
+        self.collection.delete(where={"filename": filename})
+
+    def query(self, embedding, n_results):
+        """[(id, metadata, cosine similarity)], best first; no document text"""
+        results = self.collection.query(
+            query_embeddings=[embedding], n_results=n_results, include=["metadatas", "distances"]
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return []
+        return [
+            (doc_id, results["metadatas"][0][i], 1 - results["distances"][0][i])
+            for i, doc_id in enumerate(results["ids"][0])
+        ]
+
+    def get(self, ids, include_documents=False):
+        """[(id, document or None, metadata)] for the ids that exist"""
+        include = ["documents", "metadatas"] if include_documents else ["metadatas"]
+        batch = self.collection.get(ids=ids, include=include)
+        documents = batch["documents"] if include_documents else [None] * len(batch["ids"])
+        return list(zip(batch["ids"], documents, batch["metadatas"]))
+
+    def vectors(self, ids):
+        """{id: embedding} for the ids that exist"""
+        batch = self.collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(batch["ids"], batch["embeddings"]))
+
+    def iter_records(self, page_size=1000):
+        """Every stored (ids, documents, metadatas), a page at a time"""
+        offset = 0
+        while True:
+            batch = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not batch["ids"]:
+                return
+            yield batch["ids"], batch["documents"], batch["metadatas"]
+            offset += len(batch["ids"])
+
+
+class NumpyVectorStore:
+    """Exact cosine search over a memory-mapped float16 or int8 matrix.
+
+    Unit-normalized vectors are appended to vectors.bin (int8 rows carry a
+    float32 scale in scales.bin) and ids and metadata (plus document text, if
+    given) to records.jsonl. Deletes are tombstones in the same log, and the files are
+    compacted once most rows are dead: the live rows are written out as a
+    new generation of files, and meta.json switching to that generation is
+    the single atomic step that commits it. Queries score the mapped matrix block
+    by block with one matrix-vector product each and pick the top k with
+    argpartition. No index build, no SQLite, nothing to import but NumPy.
+    """
+
+    def __init__(self, path, dtype="float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype {dtype!r}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.backend = "numpy" if dtype == "float16" else "numpy-int8"
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._ids = []  # row -> id
+        self._documents = []
+        self._metadatas = []
+        self._live = np.zeros(0, dtype=bool)
+        self._rows = {}  # id -> live row
+        self._matrix = None  # (memmap, scales), reopened after writes
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _data_file(self, name, generation=None):
+        """Path of a data file in the current (or given) generation; generation 0 has plain names"""
+        generation = self._generation if generation is None else generation
+        if generation:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{generation}{ext}"
+        return self._file(name)
+
+    def _write_meta(self, generation):
+        temp_path = self._file("meta.json.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name, "generation": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._file("meta.json"))
+
+    def _remove_other_generations(self):
+        """Delete data files not in the current generation (left by a compaction)"""
+        current = {self._data_file(name) for name in _DATA_FILES}
+        for name in _DATA_FILES:
+            stem, ext = os.path.splitext(name)
+            for path in glob.glob(self._file(f"{stem}*{ext}")):
+                if path not in current:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass  # Still mapped on some platforms; the next load retries
+
+    def _load(self):
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta["dtype"] != self.dtype.name:
+            raise ValueError(f"{self.path} holds {meta['dtype']} vectors, not {self.dtype.name}")
+        self.dim = meta["dim"]
+        self._generation = meta.get("generation", 0)
+        # Files of an interrupted or superseded compaction
+        self._remove_other_generations()
+
+        deleted = []
+        if os.path.exists(self._data_file("records.jsonl")):
+            with open(self._data_file("records.jsonl"), "r+b") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn final line from an interrupted write; later appends start here
+                        f.truncate(offset)
+                        break
+                    offset += len(line)
+                    if "delete" in record:
+                        deleted.extend(record["delete"])
+                        continue
+                    self._ids.append(record["id"])
+                    self._documents.append(record.get("document"))
+                    self._metadatas.append(record["metadata"])
+        self._live = np.ones(len(self._ids), dtype=bool)
+        self._live[deleted] = False
+        self._rows = {self._ids[row]: row for row in np.flatnonzero(self._live)}
+
+        # Drop vectors written without a matching record
+        for name, row_bytes in self._row_files():
+            with open(self._data_file(name), "ab") as f:
+                f.truncate(len(self._ids) * row_bytes)
+
+    def _row_files(self):
+        files = [("vectors.bin", self.dim * self.dtype.itemsize)]
+        if self.dtype == np.int8:
+            files.append(("scales.bin", 4))
+        return files
+
+    def _encode(self, vectors):
+        """(rows to store, per-row scales or None) for unit vectors"""
+        if self.dtype == np.float16:
+            return vectors.astype(np.float16), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    @staticmethod
+    def _record(doc_id, document, metadata):
+        record = {"id": doc_id, "metadata": metadata}
+        if document is not None:
+            record["document"] = document
+        return record
+
+    def _append_log(self, records):
+        with open(self._data_file("records.jsonl"), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def _kill(self, rows):
+        """Tombstone rows; caller holds the lock"""
+        rows = [int(row) for row in rows if self._live[row]]
+        if rows:
+            self._live[rows] = False
+            for row in rows:
+                self._rows.pop(self._ids[row], None)
+            self._append_log([{"delete": rows}])
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        if documents is None:
+            documents = [None] * len(ids)
+        vectors = _unit_rows(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_meta(self._generation)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+
+            self._kill([self._rows[doc_id] for doc_id in ids if doc_id in self._rows])
+            rows, scales = self._encode(vectors)
+            # Vectors go first; records written after them are what make rows visible
+            with open(self._data_file("vectors.bin"), "ab") as f:
+                f.write(rows.tobytes())
+            if scales is not None:
+                with open(self._data_file("scales.bin"), "ab") as f:
+                    f.write(scales.tobytes())
+            first = len(self._ids)
+            self._append_log(
+                self._record(doc_id, document, metadata)
+                for doc_id, document, metadata in zip(ids, documents, metadatas)
+            )
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            self._rows.update((doc_id, first + i) for i, doc_id in enumerate(ids))
+            self._matrix = None
+            self._maybe_compact()
+
+    def delete_file(self, filename):
+        with self._lock:
+            self._kill([
+                row for row in self._rows.values()
+                if (self._metadatas[row] or {}).get("filename") == filename
+            ])
+            self._matrix = None
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._ids) - len(self._rows)
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead > len(self._rows):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the files with live rows only; caller holds the lock"""
+        keep = np.flatnonzero(self._live)
+        matrix, scales = self._open_matrix()
+        generation = self._generation + 1
+        paths = {name: self._data_file(name, generation) for name in _DATA_FILES}
+        with open(paths["vectors.bin"], "wb") as f:
+            f.write(np.ascontiguousarray(matrix[keep]).tobytes())
+            os.fsync(f.fileno())
+        if scales is not None:
+            with open(paths["scales.bin"], "wb") as f:
+                f.write(np.ascontiguousarray(scales[keep]).tobytes())
+                os.fsync(f.fileno())
+        with open(paths["records.jsonl"], "w", encoding="utf-8") as f:
+            for row in keep:
+                f.write(json.dumps(self._record(self._ids[row], self._documents[row], self._metadatas[row])) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # The commit point: until meta.json names the new generation, a crash leaves the old files in use
+        self._write_meta(generation)
+        self._generation = generation
+        # Open memmaps keep the old files' data readable after they are unlinked
+        self._remove_other_generations()
+
+        self._ids = [self._ids[row] for row in keep]
+        self._documents = [self._documents[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._live = np.ones(len(keep), dtype=bool)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._matrix = None
+
+    def _open_matrix(self):
+        """Memory-mapped (matrix, scales) for the current rows; caller holds the lock"""
+        if self._matrix is None:
+            rows = len(self._ids)
+            if rows == 0:
+                return np.zeros((0, self.dim or 0), dtype=self.dtype), None
+            matrix = np.memmap(self._data_file("vectors.bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            scales = None
+            if self.dtype == np.int8:
+                scales = np.memmap(self._data_file("scales.bin"), dtype=np.float32, mode="r", shape=(rows,))
+            self._matrix = (matrix, scales)
+        return self._matrix
+
+    def query(self, embedding, n_results):
+        """[(id, metadata, cosine similarity)], best first; no document text"""
+        query = _unit_rows(embedding)[0]
+        with self._lock:
+            if not self._rows:
+                return []
+            matrix, scales = self._open_matrix()
+            live = self._live.copy()
+            # Compaction swaps in new lists, so these stay consistent with the matrix
+            ids, metadatas = self._ids, self._metadatas
+
+        similarities = np.empty(len(live), dtype=np.float32)
+        for start in range(0, len(live), QUERY_BLOCK_ROWS):
+            block = matrix[start:start + QUERY_BLOCK_ROWS]
+            similarities[start:start + len(block)] = block.astype(np.float32) @ query
+        if scales is not None:
+            similarities *= scales
+        similarities[~live] = -np.inf
+
+        k = min(n_results, int(live.sum()))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [
+            (ids[row], metadatas[row], float(similarities[row]))
+            for row in top
+        ]
+
+    def get(self, ids, include_documents=False):
+        """[(id, document or None, metadata)] for the ids that exist"""
+        with self._lock:
+            rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            return [
+                (self._ids[row], self._documents[row] if include_documents else None, self._metadatas[row])
+                for row in rows
+            ]
+
+    def vectors(self, ids):
+        """{id: unit embedding} for the ids that exist, widened to float32"""
+        with self._lock:
+            found = [doc_id for doc_id in ids if doc_id in self._rows]
+            if not found:
+                return {}
+            rows = [self._rows[doc_id] for doc_id in found]
+            matrix, scales = self._open_matrix()
+        vectors = matrix[rows].astype(np.float32)
+        if scales is not None:
+            vectors *= scales[rows][:, None]
+        return dict(zip(found, vectors))
+
+    def iter_records(self, page_size=1000):
+        """Every stored (ids, documents, metadatas), a page at a time"""
+        with self._lock:
+            rows = sorted(self._rows.values())
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            yield (
+                [self._ids[row] for row in page],
+                [self._documents[row] for row in page],
+                [self._metadatas[row] for row in page],
+            )